@@ -27,7 +27,7 @@ from pathlib import Path
 from datetime import datetime
 
 # Import shared utilities
-from flowscribe_utils import LLMClient, CostTracker, format_cost, format_duration
+from flowscribe_utils import LLMClient, CostTracker, format_cost, format_duration, llm_cache_from_env
 from logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -278,7 +278,7 @@ def generate_review(project_name, domain, output_dir, api_key, model):
     # Step 4: Call LLM
     logger.info("Step 4: Generating architectural review with premium model...\n")
     tracker = CostTracker(model)
-    llm = LLMClient(api_key, model, tracker)
+    llm = LLMClient(api_key, model, tracker, cache=llm_cache_from_env())
     t0 = time.time()
     result = llm.call(prompt)
     duration = time.time() - t0
@@ -17,7 +17,9 @@ from pathlib import Path
 import json
 
 # Import shared utilities
-from flowscribe_utils import LLMClient, CostTracker, parse_llm_json, format_cost, format_duration
+from flowscribe_utils import (
+    LLMClient, CostTracker, parse_llm_json, format_cost, format_duration, llm_cache_from_env
+)
 from logger import setup_logger
 from constants import MAX_FILE_SIZE
 
@@ -64,7 +66,9 @@ def read_project_files(project_dir, max_file_size=MAX_FILE_SIZE):
         for filepath in project_path.glob(pattern):
             if filepath.is_file():
                 try:
-                    txt = filepath.read_text(encoding='utf-8', errors='ignore')
+                    # Bounded read: one char past the limit is enough to detect truncation
+                    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
+                        txt = f.read(max_file_size + 1)
                     if len(txt) > max_file_size:
                         txt = txt[:max_file_size] + "\n... [truncated]"
                     files_content[filepath.name] = txt
@@ -78,7 +82,9 @@ def read_project_files(project_dir, max_file_size=MAX_FILE_SIZE):
         for doc_file in docs_dir.glob('*.md'):
             if doc_file.name.lower() in ['architecture.md', 'overview.md', 'introduction.md']:
                 try:
-                    txt = doc_file.read_text(encoding='utf-8', errors='ignore')
+                    # Bounded read: one char past the limit is enough to detect truncation
+                    with open(doc_file, 'r', encoding='utf-8', errors='ignore') as f:
+                        txt = f.read(max_file_size + 1)
                     if len(txt) > max_file_size:
                         txt = txt[:max_file_size] + "\n... [truncated]"
                     files_content[f'docs/{doc_file.name}'] = txt
@@ -331,7 +337,7 @@ def main():
     logger.info(f"Output: {args.output}\n")
 
     tracker = CostTracker(args.model)
-    llm = LLMClient(api_key, args.model, tracker)
+    llm = LLMClient(api_key, args.model, tracker, cache=llm_cache_from_env())
 
     # Step 1: Read project files
     logger.info("Step 1: Reading project files...")
@@ -17,8 +17,8 @@ from datetime import datetime
 from collections import defaultdict
 
 # Import shared utilities
-from flowscribe_utils import CostTracker, format_duration
-from flowscribe_utils import MermaidIdRegistry, mermaid_safe_id
+from flowscribe_utils import CostTracker, format_duration, load_json_file, collect_layer_files
+from flowscribe_utils import MermaidIdRegistry, mermaid_safe_id, load_yaml_file
 from logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -27,7 +27,7 @@ logger = setup_logger(__name__)
 class C4Level3Generator:
     """Generate C4 Level 3 component diagrams"""
     
-    def __init__(self, deptrac_report_path, project_dir=None, model="none"):
+    def __init__(self, deptrac_report_path, project_dir=None, model="none", layer_files=None):
         # Security: Resolve paths to absolute and validate
         self.report_path = Path(deptrac_report_path).resolve()
 
@@ -71,7 +71,10 @@ class C4Level3Generator:
         
         # Parse report
         parse_start = time.time()
-        self._parse_components_from_filesystem()  # NEW METHOD
+        if layer_files is not None:
+            self._parse_components_from_layer_files(layer_files)
+        else:
+            self._parse_components_from_filesystem()  # NEW METHOD
         parse_time = time.time() - parse_start
         
         # Record timing (no tokens/cost since no LLM)
@@ -138,49 +141,14 @@ class C4Level3Generator:
             logger.warning("   Falling back to violation-based parsing")
             self._parse_components()  # Fallback to old method
             return
-        
+
         try:
-            import yaml
-            with open(deptrac_yaml, 'r') as f:
-                config = yaml.safe_load(f)
-            
-            # For each layer, scan files matching its patterns
-            for layer_def in config.get('deptrac', {}).get('layers', []):
-                layer_name = layer_def['name']
-                
-                for collector in layer_def.get('collectors', []):
-                    collector_type = collector.get('type')
-                    pattern = collector.get('value', '')
-                    
-                    if collector_type == 'directory':
-                        # Convert 'wp-admin/.*' to 'wp-admin/**/*.php'
-                        dir_pattern = pattern.replace('/.*', '/**/*.php')
-                        
-                        # Scan for PHP files
-                        for php_file in self.project_dir.glob(dir_pattern):
-                            if php_file.is_file() and 'vendor' not in str(php_file) and 'test' not in str(php_file).lower():
-                                component_name = self._extract_component_name(str(php_file))
-                                rel_path = php_file.relative_to(self.project_dir)
-                                
-                                # Add to layer components
-                                self.layer_components[layer_name][component_name].append({
-                                    'file': str(rel_path),
-                                    'message': None,
-                                    'line': None
-                                })
-                    
-                    elif collector_type == 'glob':
-                        # Direct glob pattern like '*.php'
-                        for php_file in self.project_dir.glob(pattern):
-                            if php_file.is_file() and 'vendor' not in str(php_file):
-                                component_name = self._extract_component_name(str(php_file))
-                                rel_path = php_file.relative_to(self.project_dir)
-                                
-                                self.layer_components[layer_name][component_name].append({
-                                    'file': str(rel_path),
-                                    'message': None,
-                                    'line': None
-                                })
+            # Raises ImportError (handled below) if PyYAML is missing
+            config = load_yaml_file(deptrac_yaml)
+
+            # Collect each layer's files in one walk with precompiled collector regexes
+            layer_files = collect_layer_files(self.project_dir, config.get('deptrac', {}).get('layers', []))
+            self._add_layer_file_components(layer_files)
             
             # Also parse violations for dependency information
             self._parse_violations_for_dependencies()
@@ -189,13 +157,36 @@ class C4Level3Generator:
             logger.info(f"  Found {len(self.layer_components)} layers")
 
         except Exception as e:
-            logger.warning(f"⚠️  Error parsing deptrac.yaml: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.warning(f"⚠️  Error parsing deptrac.yaml: {e}", exc_info=True)
             logger.warning("   Falling back to violation-based parsing")
             self._parse_components()  # Fallback
     
 
+    def _parse_components_from_layer_files(self, layer_files):
+        """Extract components from a precomputed layer -> PHP files mapping
+
+        Args:
+            layer_files: Dict mapping layer name to file paths relative to project_dir
+        """
+        self._add_layer_file_components(layer_files)
+
+        # Also parse violations for dependency information
+        self._parse_violations_for_dependencies()
+
+        logger.info(f"✓ Loaded components from layer file list")
+        logger.info(f"  Found {len(self.layer_components)} layers")
+
+    def _add_layer_file_components(self, layer_files):
+        """Register one component entry per file in a layer -> PHP files mapping"""
+        for layer_name, files in layer_files.items():
+            for rel_path in files:
+                component_name = self._extract_component_name(rel_path)
+                self.layer_components[layer_name][component_name].append({
+                    'file': rel_path,
+                    'message': None,
+                    'line': None
+                })
+
     def _parse_violations_for_dependencies(self):
         """Parse violation messages to extract dependency relationships"""
         if 'files' not in self.report:
@@ -444,24 +435,29 @@ class C4Level3Generator:
         
         # Group components by category
         categorized = self._categorize_components(layer_name, self.layer_components[layer_name])
+        details_by_name = {}
+        for comp in component_list:
+            details_by_name.setdefault(comp['name'], comp)
         
+        # Collect sections in a list and join once instead of growing one string
+        sections = [doc]
         for category, comp_names in categorized.items():
             if comp_names:
-                doc += f"### {category}\n\n"
+                sections.append(f"### {category}\n\n")
                 
                 for comp_name in sorted(comp_names):
-                    comp_detail = next((c for c in component_list if c['name'] == comp_name), None)
+                    comp_detail = details_by_name.get(comp_name)
                     if comp_detail:
-                        doc += f"#### {comp_detail['name']}\n\n"
-                        doc += f"**Purpose:** {comp_detail['purpose']}\n\n"
-                        doc += f"**File:** `{comp_detail['file'].split('/')[-1]}`\n\n"
+                        sections.append(f"#### {comp_detail['name']}\n\n")
+                        sections.append(f"**Purpose:** {comp_detail['purpose']}\n\n")
+                        sections.append(f"**File:** `{comp_detail['file'].split('/')[-1]}`\n\n")
                         
                         if comp_detail['violation_count'] > 0:
-                            doc += f"**Architectural Issues:** {comp_detail['violation_count']} violations detected\n\n"
+                            sections.append(f"**Architectural Issues:** {comp_detail['violation_count']} violations detected\n\n")
                         
-                        doc += "---\n\n"
+                        sections.append("---\n\n")
         
-        doc += f"""
+        sections.append(f"""
 ## Statistics
 
 - **Total Components:** {len(component_list)}
@@ -487,9 +483,9 @@ Use the LLM-enhanced version: `llm-enhancer.py --enhance-components`
 ---
 
 *Component diagram generated from Deptrac dependency analysis*
-"""
+""")
         
-        return doc
+        return "".join(sections)
 
 
 def main():
@@ -530,6 +526,10 @@ def main():
         '--project-dir',
         help='Project directory path'
     )
+    parser.add_argument(
+        '--layer-files',
+        help='JSON file mapping layer names to PHP files (skips scanning the project directory)'
+    )
     parser.add_argument('--debug', action='store_true', help='Enable debug logging')
 
     args = parser.parse_args()
@@ -589,8 +589,16 @@ def main():
     logger.info(f"Step 1: Loading Deptrac report and extracting {args.layer} components...")
     start_time = time.time()
     
+    layer_files = None
+    if args.layer_files:
+        try:
+            layer_files = load_json_file(args.layer_files)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️  Could not load layer files ({e}), scanning project directory instead")
+
     try:
-        generator = C4Level3Generator(args.deptrac_report, project_dir=args.project_dir, model='none')
+        generator = C4Level3Generator(args.deptrac_report, project_dir=args.project_dir, model='none',
+                                      layer_files=layer_files)
     except Exception as e:
         logger.error(f"✗ Error: Failed to load Deptrac report: {e}")
         return 1
@@ -16,7 +16,10 @@ from datetime import datetime
 from pathlib import Path
 
 # Import shared utilities
-from flowscribe_utils import LLMClient, CostTracker, parse_llm_json, format_cost, format_duration
+from flowscribe_utils import (
+    LLMClient, CostTracker, parse_llm_json, format_cost, format_duration, load_yaml_file,
+    llm_cache_from_env
+)
 from logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -57,9 +60,8 @@ def scan_codebase_structure(project_dir):
     
     if deptrac_yaml.exists():
         try:
-            import yaml
-            with open(deptrac_yaml, 'r') as f:
-                config = yaml.safe_load(f)
+            # Raises ImportError (handled below) if PyYAML is missing
+            config = load_yaml_file(deptrac_yaml)
             # Extract paths from deptrac config
             paths = config.get('deptrac', {}).get('paths', [])
             # Remove ./ prefix and add to search_dirs
@@ -75,17 +77,28 @@ def scan_codebase_structure(project_dir):
     
     for search_dir in search_dirs:
         dir_path = project_path / search_dir
-        if dir_path.exists():
-            for php_file in dir_path.rglob('*.php'):
-                # Skip tests and vendor
-                if 'test' in str(php_file).lower() or 'vendor' in str(php_file):
-                    continue
-                rel_path = php_file.relative_to(project_path)
-                php_files.append({
-                    'path': str(rel_path),
-                    'name': php_file.stem,
-                    'size': php_file.stat().st_size
-                })
+        if not dir_path.is_dir():
+            continue
+        # Walk with relative path strings; tests and vendor are pruned per
+        # directory instead of scanning every file's full path
+        stack = [(str(dir_path), f"{search_dir.rstrip('/')}/")]
+        while stack:
+            current, rel_dir = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        name = entry.name
+                        if entry.is_dir(follow_symlinks=False):
+                            if name != 'vendor' and 'test' not in name.lower():
+                                stack.append((entry.path, f"{rel_dir}{name}/"))
+                        elif name.endswith('.php') and 'test' not in name.lower() and entry.is_file():
+                            php_files.append({
+                                'path': f"{rel_dir}{name}",
+                                'name': name[:-4],
+                                'size': entry.stat().st_size
+                            })
+            except OSError:
+                continue
     
     return php_files
 
@@ -202,8 +215,8 @@ def read_component_code(project_dir, file_path):
     
     try:
         with open(full_path, 'r', encoding='utf-8', errors='ignore') as f:
-            code = f.read()
-            # Limit to reasonable size
+            # Limit to reasonable size (read one extra char to detect truncation)
+            code = f.read(30001)
             if len(code) > 30000:
                 code = code[:30000] + "\n... [truncated - file too large]"
             return code
@@ -677,7 +690,7 @@ def main():
     
     # Initialize cost tracker and LLM client
     tracker = CostTracker(args.model)
-    llm = LLMClient(api_key, args.model, tracker)
+    llm = LLMClient(api_key, args.model, tracker, cache=llm_cache_from_env())
     
     # Create output directory
     output_dir = Path(args.output_dir)
@@ -9,6 +9,19 @@ Centralized constants for magic numbers and configuration values.
 MAX_FILE_SIZE = 50_000  # Maximum file size to analyze (bytes)
 MAX_FILES_TO_ANALYZE = 25  # Maximum number of files to analyze
 
+# Directory names never descended into when scanning for source files
+IGNORED_DIRS = frozenset({
+    '.git', 'node_modules', 'vendor', '.venv', '__pycache__',
+    '.idea', '.vscode', 'dist', 'build'
+})
+
+# Project-relative framework cache directories full of generated PHP
+# (Symfony var/cache, Laravel bootstrap/cache), pruned when walking the project
+IGNORED_PATHS = frozenset({'var/cache', 'bootstrap/cache'})
+
+# Test directory names (compared lowercased, whole path parts) left out of layer scans
+TEST_DIRS = frozenset({'test', 'tests'})
+
 # LLM generated code safety
 MAX_GENERATED_SCRIPT_SIZE = 1024  # Maximum size of LLM-generated scripts (bytes)
 SCRIPT_EXECUTION_TIMEOUT = 30  # Timeout for script execution (seconds)
@@ -19,6 +32,8 @@ MAX_FILES_PER_CELL = 3  # Maximum number of files to show per cell
 
 # API limits
 MAX_RESPONSE_SIZE = 10_000_000  # Maximum LLM response size (10MB)
+MAX_RESPONSE_BODY_SIZE = 2 * MAX_RESPONSE_SIZE  # Maximum raw API response body (bytes)
+RESPONSE_CHUNK_SIZE = 64 * 1024  # Streaming read size for API responses (bytes)
 DEFAULT_API_TIMEOUT = 180  # Default API request timeout (seconds)
 
 # Model defaults
@@ -17,113 +17,306 @@ Features:
 """
 
 import argparse
-import json
+import hashlib
 import os
 import sys
 import subprocess
 import re
+import shlex
+import threading
 import time
 from pathlib import Path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from pathlib import Path
+
+import yaml
+
+# Prefer the libyaml-backed C loader/dumper when available
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+
+# Optional: streaming JSON parser for large deptrac reports
+try:
+    import ijson
+except ImportError:
+    ijson = None
 
 # Import shared utilities
-from flowscribe_utils import LLMClient, CostTracker, parse_llm_json, format_cost, format_duration
+from flowscribe_utils import (
+    LLMClient, CostTracker, parse_llm_json, format_cost, format_duration,
+    load_json_file, save_json_file, append_jsonl, atomic_write, load_yaml_file,
+    compile_layer_patterns, collect_layer_files, count_directory_collector_files
+)
+from constants import IGNORED_DIRS, IGNORED_PATHS
+from llm_cache import LLMCache
 from sanitize_output_files import sanitize_output_dir
 from logger import setup_logger
 
 logger = setup_logger(__name__)
 
-def get_directory_tree(path, max_depth=3, current_depth=0, ignore_dirs={'.git', 'node_modules', 'vendor', '.venv', '__pycache__'}):
+# Maximum wall-clock time for any child process (seconds)
+SUBPROCESS_TIMEOUT = 1800
+
+# Lines of child process output kept per stream for error reporting
+OUTPUT_TAIL_LINES = 256
+
+# Maximum number of C4 generator processes running concurrently: Level 4 and
+# the Level 3 layers share one pool, so at most this many children at once
+GENERATOR_MAX_WORKERS = 4
+
+# Supports: https://github.com/owner/repo(.git) or git@github.com:owner/repo(.git)
+# The host must start the URL or follow '/', '@' or '.', so e.g. notgithub.com is rejected
+_GITHUB_URL_RE = re.compile(r'(?:^|[/@.])github\.com[:/]([^/]+)/([^/]+?)(?:\.git)?/*$')
+
+# GitHub usernames/orgs and repo names can only contain alphanumeric, hyphens, underscores, and dots
+_GITHUB_NAME_RE = re.compile(r'^[a-zA-Z0-9._-]+$')
+
+# Shell metacharacters rejected in repository URLs
+_SUSPICIOUS_URL_RE = re.compile(r'[;&|`$\n\r]')
+
+# Block-style 'paths:' list in a deptrac.yaml (key line, then its '- item' lines)
+_DEPTRAC_PATHS_RE = re.compile(r'^([ \t]*)paths:[ \t]*\n((?:[ \t]*-[^\n]*(?:\n|$))+)', re.M)
+
+# Characters allowed in an LLM-detected project name
+_NAME_SANITIZE_RE = re.compile(r'[^a-zA-Z0-9 _-]')
+
+# Directory tree prompt budget: entries listed per directory, and the depth
+# from which directories without PHP files are omitted
+TREE_MAX_ENTRIES = 25
+TREE_PHP_ONLY_DEPTH = 2
+# Dot-directories that still carry project signal (CI config)
+TREE_VISIBLE_DOT_DIRS = frozenset({'.github', '.gitlab'})
+
+
+def _pump_stream(stream, sink, buffer):
+    """
+    Forward lines from a child process pipe to a sink as they arrive.
+
+    Args:
+        stream: Readable text pipe of the child process
+        sink: Writable stream to forward lines to (e.g., sys.stdout)
+        buffer: Bounded deque keeping the most recent lines, or None to discard
+    """
+    try:
+        for line in iter(stream.readline, ''):
+            sink.write(line)
+            sink.flush()
+            if buffer is not None:
+                buffer.append(line)
+    finally:
+        stream.close()
+
+
+def count_report_files(report_path):
+    """
+    Count the entries under the top-level 'files' key of a deptrac JSON report.
+
+    Uses ijson to stream the report in constant memory when installed,
+    otherwise falls back to loading the whole document (via orjson if present).
+
+    Args:
+        report_path: Path to deptrac-report.json
+
+    Returns:
+        Number of files listed in the report
+
+    Raises:
+        ValueError: If the report is not valid JSON
+    """
+    if ijson is not None:
+        with open(report_path, 'rb') as f:
+            try:
+                return sum(1 for _ in ijson.kvitems(f, 'files'))
+            except ijson.JSONError as e:
+                raise ValueError(f"Invalid JSON in deptrac report: {e}") from e
+
+    data = load_json_file(report_path)
+    return len(data.get('files', {}))
+
+
+_IGNORED_PATH_PREFIXES = tuple(f"{path}/" for path in IGNORED_PATHS)
+
+
+def _is_ignored_path(rel_path):
+    """Check whether a relative path lies in an ignored directory or cache path."""
+    return (rel_path.startswith(_IGNORED_PATH_PREFIXES)
+            or any(part in IGNORED_DIRS for part in rel_path.split('/')[:-1]))
+
+
+def git_list_php_files(project_dir):
+    """
+    List tracked PHP files using git's index instead of walking the filesystem.
+
+    Args:
+        project_dir: Path to project directory
+
+    Returns:
+        List of relative POSIX paths, or None if project_dir is not a git
+        checkout or git is unavailable
+    """
+    if not (Path(project_dir) / '.git').exists():
+        return None
+
+    try:
+        result = subprocess.run(
+            ['git', '-C', str(project_dir), 'ls-files', '-z', '--', '*.php'],
+            capture_output=True,
+            text=True,
+            timeout=120
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.debug(f"git ls-files unavailable, walking filesystem: {e}")
+        return None
+
+    if result.returncode != 0:
+        logger.debug(f"git ls-files failed, walking filesystem: {result.stderr.strip()}")
+        return None
+
+    return [p for p in result.stdout.split('\0') if p and not _is_ignored_path(p)]
+
+
+def list_php_files(project_dir):
+    """
+    List PHP files in a project, skipping ignored directories.
+
+    Uses git ls-files for git checkouts and falls back to os.walk otherwise.
+
+    Args:
+        project_dir: Path to project directory
+
+    Returns:
+        List of PHP file paths relative to project_dir (POSIX separators)
+    """
+    tracked = git_list_php_files(project_dir)
+    if tracked is not None:
+        return tracked
+
+    php_files = []
+    for root, dirs, files in os.walk(project_dir, topdown=True, followlinks=False):
+        # Skip common directories (pruned in place so os.walk never descends)
+        rel_root = os.path.relpath(root, project_dir)
+        rel_prefix = '' if rel_root == '.' else rel_root.replace(os.sep, '/') + '/'
+        dirs[:] = [d for d in dirs if d not in IGNORED_DIRS and rel_prefix + d not in IGNORED_PATHS]
+        for file in files:
+            if file.endswith('.php'):
+                rel_path = file if rel_root == '.' else os.path.join(rel_root, file)
+                php_files.append(rel_path.replace(os.sep, '/'))
+    return php_files
+
+
+def _has_php_files(path):
+    """
+    Check whether a directory tree contains at least one PHP file.
+
+    Stops at the first match instead of collecting every file in the subtree.
+
+    Args:
+        path: Root directory path
+
+    Returns:
+        True if a .php file exists under path
+    """
+    stack = [path]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    if entry.is_file() and entry.name.endswith('.php'):
+                        return True
+                    if entry.is_dir(follow_symlinks=False) and entry.name not in IGNORED_DIRS:
+                        stack.append(entry.path)
+        except OSError:
+            continue
+    return False
+
+
+def get_directory_tree(path, max_depth=3, current_depth=0, ignore_dirs=None,
+                       php_dirs=None, max_entries=TREE_MAX_ENTRIES):
     """
     Get directory structure as formatted text for LLM analysis.
     
     Args:
         path: Root directory path
         max_depth: Maximum depth to traverse
-        current_depth: Current recursion depth
-        ignore_dirs: Set of directory names to skip
+        current_depth: Depth of path itself (indentation level of its entries)
+        ignore_dirs: Set of directory names to skip (default: IGNORED_DIRS)
+        php_dirs: Optional set of directory paths (built from path) that contain
+                  PHP files; directories deeper than TREE_PHP_ONLY_DEPTH without
+                  PHP files are left out to save prompt tokens
+        max_entries: Maximum entries listed per directory before summarizing
     
     Returns:
         String representation of directory tree
     """
-    if current_depth >= max_depth:
-        return ""
-    
+    if ignore_dirs is None:
+        ignore_dirs = IGNORED_DIRS
     tree = []
+    indents = tuple("  " * depth for depth in range(max_depth + 1))
+    _append_directory_tree(tree, path, max_depth, current_depth, ignore_dirs,
+                           php_dirs, max_entries, indents)
+    return "\n".join(tree)
+
+
+def _append_directory_tree(tree, path, max_depth, current_depth, ignore_dirs,
+                           php_dirs, max_entries, indents):
+    """Append the lines of one directory level (and its children) to tree."""
+    if current_depth >= max_depth:
+        return
+
+    indent = indents[current_depth]
+    shown = 0
+    omitted = 0
     try:
-        items = sorted(os.listdir(path))
-        for item in items:
+        # DirEntry reuses the file type from readdir, avoiding a stat per entry
+        with os.scandir(path) as it:
+            entries = sorted(it, key=lambda e: e.name)
+        for entry in entries:
+            item = entry.name
             # Skip hidden files and ignored directories
-            if item.startswith('.') and item not in {'.github', '.gitlab'}:
+            if item.startswith('.') and item not in TREE_VISIBLE_DOT_DIRS:
                 continue
             
-            item_path = os.path.join(path, item)
-            indent = "  " * current_depth
+            item_path = entry.path
+            is_dir = entry.is_dir(follow_symlinks=False)
+
+            # Only show PHP files for brevity
+            if not is_dir and not item.endswith('.php'):
+                continue
+
+            # Deep directories without any PHP code add tokens but no signal
+            if (is_dir and php_dirs is not None and item not in ignore_dirs
+                    and current_depth >= TREE_PHP_ONLY_DEPTH and item_path not in php_dirs):
+                continue
+
+            if shown >= max_entries:
+                omitted += 1
+                continue
+            shown += 1
             
-            if os.path.isdir(item_path):
+            if is_dir:
                 if item in ignore_dirs:
                     tree.append(f"{indent}{item}/ (skipped)")
                     continue
                     
                 tree.append(f"{indent}{item}/")
-                # Recurse into subdirectory
-                subtree = get_directory_tree(item_path, max_depth, current_depth + 1, ignore_dirs)
-                if subtree:
-                    tree.append(subtree)
+                # Children are written straight into the shared list
+                _append_directory_tree(tree, item_path, max_depth, current_depth + 1,
+                                       ignore_dirs, php_dirs, max_entries, indents)
             else:
-                # Only show PHP files for brevity
-                if item.endswith('.php'):
-                    tree.append(f"{indent}{item}")
+                tree.append(f"{indent}{item}")
     except PermissionError:
         pass
-    
-    return "\n".join(tree)
 
+    if omitted:
+        tree.append(f"{indent}... ({omitted} more)")
 
-def generate_deptrac_config_with_llm(project_dir, project_name, domain, repo_url, llm_client):
-    """
-    Generate deptrac.yaml configuration using LLM based on actual project structure.
-    
-    Args:
-        project_dir: Path to project directory
-        project_name: Detected project name
-        domain: Detected project domain
-        repo_url: GitHub repository URL
-        llm_client: Initialized LLM client
-    
-    Returns:
-        Tuple of (success: bool, yaml_content: str, metrics: dict)
-    """
-    logger.info("\n📊 Analyzing project structure...")
-
-    # Get directory structure
-    structure = get_directory_tree(project_dir, max_depth=3)
-
-    # Count PHP files for context
-    php_files = []
-    for root, dirs, files in os.walk(project_dir):
-        # Skip common directories
-        dirs[:] = [d for d in dirs if d not in {'.git', 'node_modules', 'vendor', '.venv'}]
-        for file in files:
-            if file.endswith('.php'):
-                php_files.append(os.path.join(root, file))
-
-    logger.info(f"  Found {len(php_files)} PHP files")
-    
-    prompt = f"""Analyze this PHP project and generate a deptrac.yaml configuration file.
-
-PROJECT INFORMATION:
-- Name: {project_name}
-- Domain: {domain}
-- Repository: {repo_url}
-- PHP Files: {len(php_files)}
-
-DIRECTORY STRUCTURE:
-{structure}
 
-TASK:
-Generate a valid deptrac.yaml configuration that:
+# Deptrac config rules shared by the standalone and unified prompts
+DEPTRAC_PROMPT_RULES = """Generate a valid deptrac.yaml configuration that:
 
 1. **Identifies main code directories**: Look for where the actual PHP code lives
    - Common patterns: src/, app/, lib/, wp-includes/, wp-admin/, etc.
@@ -145,12 +338,6 @@ REQUIREMENTS:
 - Include reasonable dependency rules
 - Use directory collectors (type: directory, value: pattern)
 
-IMPORTANT:
-- Return ONLY the YAML content
-- No markdown code blocks
-- No explanations or comments outside the YAML
-- Start directly with "deptrac:"
-
 CRITICAL REGEX PATTERNS:
 - For paths: Use format './directory-name' (with ./ prefix)
 - For collectors: Use format 'directory-name/.*' (NO ./ prefix, NO trailing slash)
@@ -189,72 +376,365 @@ deptrac:
       - Core
 """
 
+
+def git_checkout_fingerprint(project_dir):
+    """
+    Identify the current state of a git checkout.
+
+    Combines HEAD, the index mtime and a hash of the untracked (not ignored)
+    file list, so commits, checkouts, staging and new or deleted untracked
+    files all change the fingerprint. Edits to existing files don't, as
+    they don't change the directory tree or file list.
+
+    Args:
+        project_dir: Path to project directory
+
+    Returns:
+        Fingerprint string, or None if project_dir is not a git checkout
+    """
+    git_dir = Path(project_dir) / '.git'
+    if not git_dir.exists():
+        return None
+
+    try:
+        head = subprocess.run(
+            ['git', '-C', str(project_dir), 'rev-parse', 'HEAD'],
+            capture_output=True,
+            text=True,
+            timeout=30
+        )
+        untracked = subprocess.run(
+            ['git', '-C', str(project_dir), 'ls-files', '-z', '--others', '--exclude-standard'],
+            capture_output=True,
+            timeout=120
+        )
+        index_mtime = (git_dir / 'index').stat().st_mtime_ns
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+
+    if head.returncode != 0 or untracked.returncode != 0:
+        return None
+    untracked_hash = hashlib.blake2b(untracked.stdout, digest_size=16).hexdigest()
+    return f"{head.stdout.strip()}:{index_mtime}:{untracked_hash}"
+
+
+def scan_project_structure(project_dir, cache_path=None):
+    """
+    Collect the directory tree and PHP file list used to prompt the LLM.
+
+    Args:
+        project_dir: Path to project directory
+        cache_path: Optional JSON file caching the result for an unchanged
+                    git checkout (keyed by git_checkout_fingerprint)
+
+    Returns:
+        Tuple of (structure: str, php_files: list)
+    """
+    logger.info("\n📊 Analyzing project structure...")
+
+    fingerprint = git_checkout_fingerprint(project_dir) if cache_path else None
+    if fingerprint:
+        try:
+            cached = load_json_file(cache_path)
+            if cached.get('fingerprint') == fingerprint:
+                logger.info(f"  Found {len(cached['php_files'])} PHP files (cached)")
+                return cached['structure'], cached['php_files']
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+
+    # Count PHP files for context
+    php_files = list_php_files(project_dir)
+
+    # Every directory that holds PHP files somewhere below it. Walk up from each
+    # distinct parent directory and stop at the first ancestor already recorded.
+    php_dirs = set()
+    for parent in {rel_path.rpartition('/')[0] for rel_path in php_files}:
+        while parent:
+            dir_path = os.path.join(project_dir, parent)
+            if dir_path in php_dirs:
+                break
+            php_dirs.add(dir_path)
+            parent = parent.rpartition('/')[0]
+
+    # Get directory structure
+    structure = get_directory_tree(project_dir, max_depth=3, php_dirs=php_dirs)
+
+    if fingerprint:
+        try:
+            save_json_file(cache_path, {'fingerprint': fingerprint, 'structure': structure,
+                                        'php_files': php_files}, indent=False)
+        except OSError as e:
+            logger.debug(f"Could not cache project structure: {e}")
+
+    logger.info(f"  Found {len(php_files)} PHP files")
+    return structure, php_files
+
+
+def _remove_deptrac_paths(yaml_content, removed_paths):
+    """
+    Cut the given entries out of the block-style 'paths:' list of a deptrac.yaml.
+
+    Args:
+        yaml_content: deptrac.yaml text
+        removed_paths: Set of path values to drop
+
+    The cut is line-based, so callers must check that the result still
+    parses to the expected config (see _yaml_matches).
+
+    Returns:
+        Patched YAML text, or None if no block-style paths list was found
+    """
+    match = _DEPTRAC_PATHS_RE.search(yaml_content)
+    if not match:
+        return None
+
+    kept = [line for line in match.group(2).splitlines(keepends=True)
+            if line.strip().lstrip('-').strip().strip('\'"') not in removed_paths]
+    if not kept:
+        # Keep the key valid YAML when every path was dropped
+        return yaml_content[:match.start()] + f"{match.group(1)}paths: []\n" + yaml_content[match.end():]
+    return yaml_content[:match.start(2)] + ''.join(kept) + yaml_content[match.end(2):]
+
+
+def _yaml_matches(yaml_content, expected):
+    """Check whether yaml_content parses to exactly the expected data."""
+    try:
+        return yaml.load(yaml_content, Loader=SafeLoader) == expected
+    except yaml.YAMLError:
+        return False
+
+
+def parse_deptrac_yaml(yaml_content, project_dir):
+    """
+    Clean up and validate LLM-generated deptrac YAML.
+
+    Strips markdown code fences, checks for the 'deptrac' key and removes
+    paths that don't exist in the project.
+
+    Args:
+        yaml_content: Raw YAML text from the LLM
+        project_dir: Path to project directory
+
+    Returns:
+        Tuple of (yaml_content: str, config: dict or None)
+        where config is None if validation failed
+    """
+    yaml_content = yaml_content.strip()
+
+    # Remove markdown code blocks if LLM added them
+    if yaml_content.startswith('```'):
+        lines = yaml_content.split('\n')
+        # Remove first line (```yaml or ```)
+        lines = lines[1:]
+        # Remove last line if it's ```
+        if lines and lines[-1].strip() == '```':
+            lines = lines[:-1]
+        yaml_content = '\n'.join(lines)
+
+    # Validate it's valid YAML
+    parsed = None
+    try:
+        parsed = yaml.load(yaml_content, Loader=SafeLoader)
+        if not isinstance(parsed, dict) or 'deptrac' not in parsed:
+            raise ValueError("Generated YAML doesn't contain 'deptrac' key")
+
+        # Validate paths exist
+        valid_paths = []
+        removed_paths = set()
+        paths = parsed.get('deptrac', {}).get('paths', [])
+        for path in paths:
+            clean_path = path.lstrip('./')
+            full_path = Path(project_dir) / clean_path
+            if full_path.exists():
+                valid_paths.append(path)
+            else:
+                removed_paths.add(path)
+                logger.warning(f"  ⚠ Removing non-existent path: {path}")
+
+        # Update with only valid paths. The LLM's text is kept as-is unless a
+        # path was dropped; then only those list items are cut from the paths
+        # block, with a full re-dump if the block can't be located or the cut
+        # text doesn't parse back to the filtered config (quoting, comments...).
+        if removed_paths:
+            parsed['deptrac']['paths'] = valid_paths
+            patched = _remove_deptrac_paths(yaml_content, removed_paths)
+            if patched is None or not _yaml_matches(patched, parsed):
+                patched = yaml.dump(parsed, Dumper=SafeDumper, default_flow_style=False)
+            yaml_content = patched
+
+    except Exception as e:
+        parsed = None
+        logger.warning(f"\n⚠ Warning: Generated YAML may be invalid: {e}")
+        logger.warning("Proceeding anyway...")
+
+    return yaml_content, parsed
+
+
+def _result_metrics(result):
+    """Build the metrics dict reported for a single LLM call result."""
+    return {
+        'cost': result.get('cost', 0),
+        'duration': result.get('duration', 0),
+        'input_tokens': result.get('input_tokens', 0),
+        'output_tokens': result.get('output_tokens', 0),
+        'total_tokens': result.get('total_tokens', 0)
+    }
+
+
+def generate_deptrac_config_with_llm(project_dir, project_name, domain, repo_url, llm_client,
+                                     structure_cache=None):
+    """
+    Generate deptrac.yaml configuration using LLM based on actual project structure.
+    
+    Args:
+        project_dir: Path to project directory
+        project_name: Detected project name
+        domain: Detected project domain
+        repo_url: GitHub repository URL
+        llm_client: Initialized LLM client
+        structure_cache: Optional path caching the scanned project structure
+    
+    Returns:
+        Tuple of (success: bool, yaml_content: str, metrics: dict, config: dict or None)
+        where config is the parsed deptrac configuration (None if validation failed)
+    """
+    structure, php_files = scan_project_structure(project_dir, structure_cache)
+    
+    prompt = f"""Analyze this PHP project and generate a deptrac.yaml configuration file.
+
+PROJECT INFORMATION:
+- Name: {project_name}
+- Domain: {domain}
+- Repository: {repo_url}
+- PHP Files: {len(php_files)}
+
+DIRECTORY STRUCTURE:
+{structure}
+
+TASK:
+{DEPTRAC_PROMPT_RULES}
+IMPORTANT:
+- Return ONLY the YAML content
+- No markdown code blocks
+- No explanations or comments outside the YAML
+- Start directly with "deptrac:"
+"""
+
     try:
         # Call LLM using the correct method
         result = llm_client.call(prompt)
         
         if not result:
-            return False, None, {}
-        
-        # Extract YAML content from result
-        yaml_content = result['content'].strip()
-        
-        # Remove markdown code blocks if LLM added them
-        if yaml_content.startswith('```'):
-            lines = yaml_content.split('\n')
-            # Remove first line (```yaml or ```)
-            lines = lines[1:]
-            # Remove last line if it's ```
-            if lines and lines[-1].strip() == '```':
-                lines = lines[:-1]
-            yaml_content = '\n'.join(lines)
-        
-        # Validate it's valid YAML
-        try:
-            import yaml
-            parsed = yaml.safe_load(yaml_content)
-            if not isinstance(parsed, dict) or 'deptrac' not in parsed:
-                raise ValueError("Generated YAML doesn't contain 'deptrac' key")
-
-            # Validate paths exist
-            valid_paths = []
-            paths = parsed.get('deptrac', {}).get('paths', [])
-            for path in paths:
-                clean_path = path.lstrip('./')
-                full_path = Path(project_dir) / clean_path
-                if full_path.exists():
-                    valid_paths.append(path)
-                else:
-                    logger.warning(f"  ⚠ Removing non-existent path: {path}")
-                    
-            # Update with only valid paths
-            parsed['deptrac']['paths'] = valid_paths
-            yaml_content = yaml.dump(parsed, default_flow_style=False)
-
-        except Exception as e:
-            logger.warning(f"\n⚠ Warning: Generated YAML may be invalid: {e}")
-            logger.warning("Proceeding anyway...")
-        
-        # Build metrics dict from result
-        metrics = {
-            'cost': result.get('cost', 0),
-            'duration': result.get('duration', 0),
-            'input_tokens': result.get('input_tokens', 0),
-            'output_tokens': result.get('output_tokens', 0),
-            'total_tokens': result.get('total_tokens', 0)
-        }
+            return False, None, {}, None
+        
+        yaml_content, parsed = parse_deptrac_yaml(result['content'], project_dir)
         
-        return True, yaml_content, metrics
+        return True, yaml_content, _result_metrics(result), parsed
+
+    except Exception as e:
+        logger.exception(f"\n✗ Failed to generate deptrac config: {e}")
+        return False, None, {}, None
+
+
+def analyze_project_unified(project_dir, repo_url, repo_owner, repo_name,
+                            readme_content, composer_content, llm_client, structure_cache=None):
+    """
+    Detect project metadata and generate deptrac.yaml in a single LLM call.
+
+    The README, composer.json and directory structure are sent once and the
+    LLM answers with one JSON document holding both the metadata and the
+    deptrac configuration.
+
+    Args:
+        project_dir: Path to project directory
+        repo_url: GitHub repository URL
+        repo_owner: Repository owner
+        repo_name: Repository name
+        readme_content: First part of the README (may be empty)
+        composer_content: composer.json content (may be empty)
+        llm_client: Initialized LLM client
+        structure_cache: Optional path caching the scanned project structure
+
+    Returns:
+        Tuple of (success: bool, data: dict, metrics: dict) where data has
+        'project_name', 'project_domain', 'description', 'yaml_content'
+        and 'config' keys. success is False if the response could not be
+        parsed or contains no deptrac configuration; in the latter case data
+        still holds whatever metadata keys the response had.
+    """
+    structure, php_files = scan_project_structure(project_dir, structure_cache)
+
+    prompt = f"""Analyze this PHP repository. Provide its metadata AND generate a deptrac.yaml configuration file.
+
+Repository: {repo_url}
+Owner: {repo_owner}
+Name: {repo_name}
+PHP Files: {len(php_files)}
+
+README.md:
+```
+{readme_content if readme_content else "Not found"}
+```
+
+composer.json:
+```
+{composer_content if composer_content else "Not found"}
+```
+
+DIRECTORY STRUCTURE:
+{structure}
+
+METADATA GUIDELINES:
+- project_name should be the official project name, not the repo slug
+- project_domain should be a 2-4 word industry/domain descriptor
+- If README has the name, use it; otherwise infer from repo name and description
+
+DEPTRAC TASK:
+{DEPTRAC_PROMPT_RULES}
+RESPONSE FORMAT:
+Return a single JSON object (no other text) with exactly these keys:
+
+```json
+{{
+  "project_name": "Full project name (e.g., 'Open Journal Systems')",
+  "project_domain": "Domain/industry (e.g., 'scholarly publishing', 'e-commerce', 'content management')",
+  "description": "Brief 1-sentence description",
+  "deptrac_yaml": "The complete deptrac.yaml content as a JSON string, starting with 'deptrac:'"
+}}
+```"""
 
+    try:
+        result = llm_client.call(prompt)
     except Exception as e:
-        logger.error(f"\n✗ Failed to generate deptrac config: {e}")
-        import traceback
-        traceback.print_exc()
-        return False, None, {}
+        logger.error(f"\n✗ Unified project analysis failed: {e}")
+        return False, {}, {}
+
+    if not result:
+        return False, {}, {}
+
+    metrics = _result_metrics(result)
+    data = parse_llm_json(result['content'])
+    if not isinstance(data, dict):
+        logger.warning("⚠ Unified response is not valid JSON")
+        return False, {}, metrics
+    if not data.get('deptrac_yaml'):
+        logger.warning("⚠ Unified response missing deptrac_yaml")
+        # Hand back any metadata so only the deptrac config has to be regenerated
+        metadata = {key: data[key] for key in ('project_name', 'project_domain', 'description') if key in data}
+        return False, metadata, metrics
+
+    yaml_content, parsed = parse_deptrac_yaml(str(data['deptrac_yaml']), project_dir)
+    return True, {
+        'project_name': data.get('project_name'),
+        'project_domain': data.get('project_domain'),
+        'description': data.get('description', 'N/A'),
+        'yaml_content': yaml_content,
+        'config': parsed
+    }, metrics
 
 
 class FlowscribeAnalyzer:
-    def __init__(self, github_url, workspace_dir, output_base_dir, api_key, model):
+    def __init__(self, github_url, workspace_dir, output_base_dir, api_key, model, use_cache=True):
         self.github_url = github_url
 
         # Security: Resolve paths and validate against directory traversal
@@ -268,13 +748,27 @@ class FlowscribeAnalyzer:
         self.api_key = api_key
         self.model = model
 
+        # Shared LLM client for the in-process steps (metadata, deptrac config)
+        self.tracker = CostTracker(model)
+        # Reruns against the same output directory reuse identical LLM responses
+        self.llm_cache_dir = self.output_base_dir / '.flowscribe-llm-cache' if use_cache else None
+        cache = LLMCache(self.llm_cache_dir) if use_cache else None
+        self.llm = LLMClient(api_key, model, self.tracker, cache=cache)
+
         # Parse GitHub URL
         self.repo_owner, self.repo_name = self.parse_github_url(github_url)
         self.project_dir = self.workspace_dir / self.repo_name
         self.output_dir = self.output_base_dir / self.repo_name
+
+        # Append-only per-step metrics log (survives a crash mid-run)
+        self.metrics_log = self.output_dir / '.flowscribe-metrics.jsonl'
+
+        # Directory tree + PHP file list, reused while the checkout is unchanged
+        self.structure_cache = self.output_dir / '.flowscribe-structure.json'
         
         # Cost tracking
         self.costs = {
+            'project_analysis': {'cost': 0.0, 'time': 0.0, 'tokens': 0},
             'metadata_detection': {'cost': 0.0, 'time': 0.0, 'tokens': 0},
             'deptrac_generation': {'cost': 0.0, 'time': 0.0, 'tokens': 0},
             'architecture_review': {'cost': 0.0, 'time': 0.0, 'tokens': 0},
@@ -294,6 +788,15 @@ class FlowscribeAnalyzer:
         # Project metadata (to be detected)
         self.project_name = None
         self.project_domain = None
+
+        # Parsed deptrac.yaml (cached after generation to avoid re-parsing)
+        self._deptrac_config = None
+        # Compiled layer collector regexes, built once per config
+        self._layer_regex_table = None
+
+        # PHP files per layer, collected once and handed to the level 3 generator
+        self._layer_files = None
+        self.layer_files_path = self.output_dir / '.flowscribe-layer-files.json'
     
     def parse_github_url(self, url):
         """Parse GitHub URL to extract owner and repo name
@@ -312,35 +815,22 @@ class FlowscribeAnalyzer:
             raise ValueError("GitHub URL must be a non-empty string")
 
         # Security: Check for suspicious characters that could indicate injection attempts
-        suspicious_chars = [';', '&', '|', '`', '$', '\n', '\r']
-        if any(char in url for char in suspicious_chars):
+        if _SUSPICIOUS_URL_RE.search(url):
             raise ValueError(f"Invalid GitHub URL: contains suspicious characters")
 
-        # Remove .git suffix if present
-        url = url.rstrip('/')
-        if url.endswith('.git'):
-            url = url[:-4]
-
-        # Extract owner and repo
-        # Supports: https://github.com/owner/repo or git@github.com:owner/repo
-        patterns = [
-            r'github\.com[:/]([^/]+)/([^/]+)$',
-            r'github\.com[:/]([^/]+)/([^/]+)\.git$'
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, url)
-            if match:
-                owner, repo = match.group(1), match.group(2)
+        # Extract owner and repo (optional .git suffix and trailing slashes are
+        # stripped by the pattern)
+        match = _GITHUB_URL_RE.search(url)
+        if match:
+            owner, repo = match.group(1), match.group(2)
 
-                # Security: Validate owner and repo names
-                # GitHub usernames/orgs and repo names can only contain alphanumeric, hyphens, underscores, and dots
-                if not re.match(r'^[a-zA-Z0-9._-]+$', owner):
-                    raise ValueError(f"Invalid GitHub owner name: {owner}")
-                if not re.match(r'^[a-zA-Z0-9._-]+$', repo):
-                    raise ValueError(f"Invalid GitHub repository name: {repo}")
+            # Security: Validate owner and repo names
+            if not _GITHUB_NAME_RE.match(owner):
+                raise ValueError(f"Invalid GitHub owner name: {owner}")
+            if not _GITHUB_NAME_RE.match(repo):
+                raise ValueError(f"Invalid GitHub repository name: {repo}")
 
-                return owner, repo
+            return owner, repo
 
         raise ValueError(f"Invalid GitHub URL format: {url}")
     
@@ -356,31 +846,65 @@ class FlowscribeAnalyzer:
         logger.info(f"[Step {step_num}/{total_steps}] {text}")
         logger.info('-' * 70)
     
-    def run_command(self, cmd_list, cwd=None, capture_output=True):
-        """Run a command and return output
+    def run_command(self, cmd_list, cwd=None, capture_output=True, timeout=SUBPROCESS_TIMEOUT, env=None):
+        """Run a command, streaming its output live, and return output
+
+        Child stdout/stderr are forwarded line-by-line to our own stdout/stderr
+        so long-running steps show progress instead of blocking until exit.
+        Only the last OUTPUT_TAIL_LINES lines of each stream are kept, so
+        memory stays bounded however much a child prints.
 
         Args:
             cmd_list: List of command arguments (e.g., ['deptrac', 'analyze', '--config-file=...'])
             cwd: Working directory for command execution
-            capture_output: Whether to capture stdout/stderr
+            capture_output: Whether to keep the output tails for the return value
+            timeout: Maximum execution time in seconds
+            env: Environment for the child process (default: inherit ours)
 
         Returns:
             Tuple of (success: bool, stdout: str, stderr: str)
         """
+        stdout_buf = deque(maxlen=OUTPUT_TAIL_LINES) if capture_output else None
+        stderr_buf = deque(maxlen=OUTPUT_TAIL_LINES) if capture_output else None
+
         try:
-            result = subprocess.run(
+            process = subprocess.Popen(
                 cmd_list,
                 shell=False,  # Security: Never use shell=True to prevent command injection
                 cwd=cwd,
-                capture_output=capture_output,
+                env=env,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                bufsize=1,
                 text=True,
-                timeout=1800
+                errors='replace'
             )
-            return result.returncode == 0, result.stdout, result.stderr
-        except subprocess.TimeoutExpired:
-            return False, "", "Command timed out"
-        except Exception as e:
+        except OSError as e:
             return False, "", str(e)
+
+        pumps = [
+            threading.Thread(target=_pump_stream, args=(process.stdout, sys.stdout, stdout_buf), daemon=True),
+            threading.Thread(target=_pump_stream, args=(process.stderr, sys.stderr, stderr_buf), daemon=True)
+        ]
+        for pump in pumps:
+            pump.start()
+
+        try:
+            returncode = process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+            returncode = None
+        finally:
+            for pump in pumps:
+                pump.join()
+
+        stdout = "".join(stdout_buf) if stdout_buf is not None else ""
+        stderr = "".join(stderr_buf) if stderr_buf is not None else ""
+
+        if returncode is None:
+            return False, stdout, "Command timed out"
+        return returncode == 0, stdout, stderr
     
     def check_project_exists(self):
         """Check if project directory exists (user should clone manually)"""
@@ -391,41 +915,112 @@ class FlowscribeAnalyzer:
             logger.error(f"✗ Project directory not found: {self.project_dir}")
             logger.error(f"\n⚠ Please clone the repository manually first:")
             logger.error(f"   cd {self.workspace_dir}")
-            logger.error(f"   git clone {self.github_url}")
+            logger.error(f"   git clone --depth 1 {self.github_url}")
             logger.error(f"\n   Then run this script again.")
             return False
     
-    def detect_project_metadata(self):
-        """Use LLM to detect project name and domain from repository"""
-        logger.info("Analyzing repository to detect project name and domain...")
-        
-        step_start = time.time()
-        
-        # Initialize LLM client
-        tracker = CostTracker(self.model)
-        llm = LLMClient(self.api_key, self.model, tracker)
-        
-        # Read README if exists
+    def read_project_files(self):
+        """Read the README and composer.json used for metadata detection
+
+        Returns:
+            Tuple of (readme_content: str, composer_content: str), empty if not found
+        """
+        # Read README if exists (open directly: a missing file costs one failed
+        # open() instead of a stat() followed by an open())
         readme_content = ""
         for readme_name in ['README.md', 'README.txt', 'README']:
-            readme_path = self.project_dir / readme_name
-            if readme_path.exists():
-                try:
-                    with open(readme_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        readme_content = f.read()[:5000]  # First 5000 chars
-                    break
-                except:
-                    pass
+            try:
+                with open(self.project_dir / readme_name, 'r', encoding='utf-8', errors='ignore') as f:
+                    readme_content = f.read(5000)  # First 5000 chars only
+                break
+            except OSError:
+                continue
         
         # Read composer.json if exists (PHP projects)
         composer_content = ""
-        composer_path = self.project_dir / 'composer.json'
-        if composer_path.exists():
-            try:
-                with open(composer_path, 'r', encoding='utf-8') as f:
-                    composer_content = f.read()
-            except:
-                pass
+        try:
+            with open(self.project_dir / 'composer.json', 'r', encoding='utf-8', errors='ignore') as f:
+                composer_content = f.read(32768)  # Cap pathological inputs at 32KB
+        except OSError:
+            pass
+
+        return readme_content, composer_content
+
+    def use_fallback_metadata(self):
+        """Derive project name and domain from the repository name"""
+        self.project_name = self.repo_name.replace('-', ' ').title()
+        self.project_domain = "software"
+
+    def apply_project_metadata(self, data):
+        """Set project name and domain from LLM-detected metadata"""
+        raw_name = data.get('project_name') or self.repo_name.title()
+        # Keep only alphanumeric, spaces, hyphens, underscores
+        self.project_name = _NAME_SANITIZE_RE.sub('', str(raw_name))
+        self.project_domain = data.get('project_domain') or 'software'
+        description = data.get('description', 'N/A')
+
+        logger.info(f"✓ Detected project: {self.project_name}")
+        logger.info(f"✓ Domain: {self.project_domain}")
+        logger.info(f"✓ Description: {description}")
+
+    def record_step_cost(self, step, metrics):
+        """Record cost, time and tokens of an in-process LLM step"""
+        self.costs[step]['cost'] = metrics.get('cost', 0)
+        self.costs[step]['time'] = metrics.get('duration', 0)
+        self.costs[step]['tokens'] = metrics.get('total_tokens', 0)
+        self.emit_step_metric(step)
+
+    def emit_step_metric(self, step):
+        """Append the current metrics of a step to the JSONL metrics log"""
+        try:
+            append_jsonl(self.metrics_log, {'step': step, 'ts': time.time(), **self.costs[step]})
+        except OSError as e:
+            logger.warning(f"⚠ Could not write step metrics to {self.metrics_log}: {e}")
+
+    def analyze_project(self):
+        """Detect project metadata and generate deptrac.yaml in one LLM call
+
+        Falls back to the separate metadata and deptrac steps if the
+        combined response can't be used.
+        """
+        logger.info("Analyzing repository to detect metadata and generate deptrac.yaml...")
+
+        readme_content, composer_content = self.read_project_files()
+
+        success, data, metrics = analyze_project_unified(
+            project_dir=str(self.project_dir),
+            repo_url=self.github_url,
+            repo_owner=self.repo_owner,
+            repo_name=self.repo_name,
+            readme_content=readme_content,
+            composer_content=composer_content,
+            llm_client=self.llm,
+            structure_cache=self.structure_cache
+        )
+
+        if metrics:
+            self.record_step_cost('project_analysis', metrics)
+
+        if not success:
+            if data.get('project_name'):
+                # Metadata came through; only the deptrac config needs another call
+                logger.warning("⚠ Combined analysis returned no deptrac config, generating it separately")
+                self.apply_project_metadata(data)
+                return self.check_deptrac_config()
+            logger.warning("⚠ Combined analysis unusable, falling back to separate steps")
+            return self.detect_project_metadata() and self.check_deptrac_config()
+
+        self.apply_project_metadata(data)
+        self.save_deptrac_config(data['yaml_content'], data['config'])
+        logger.info(f"✓ Cost: {format_cost(metrics['cost'])} | Time: {format_duration(metrics['duration'])} | Tokens: {metrics['total_tokens']:,}")
+
+        return True
+
+    def detect_project_metadata(self):
+        """Use LLM to detect project name and domain from repository"""
+        logger.info("Analyzing repository to detect project name and domain...")
+        
+        readme_content, composer_content = self.read_project_files()
         
         # Build prompt
         prompt = f"""Analyze this repository and provide metadata in JSON format.
@@ -462,14 +1057,11 @@ Guidelines:
 Provide ONLY the JSON, no other text."""
 
         # Call LLM
-        result = llm.call(prompt)
-        
-        step_time = time.time() - step_start
+        result = self.llm.call(prompt)
         
         if not result:
             # Fallback to repo name
-            self.project_name = self.repo_name.replace('-', ' ').title()
-            self.project_domain = "software"
+            self.use_fallback_metadata()
             logger.warning(f"⚠ Using fallback: {self.project_name} / {self.project_domain}")
             return True
         
@@ -477,46 +1069,40 @@ Provide ONLY the JSON, no other text."""
         data = parse_llm_json(result['content'])
         
         if data:
-            raw_name = data.get('project_name', self.repo_name.title())
-            # Keep only alphanumeric, spaces, hyphens, underscores
-            self.project_name = re.sub(r'[^a-zA-Z0-9 _-]', '', raw_name)
-            self.project_domain = data.get('project_domain', 'software')
-            description = data.get('description', 'N/A')
-
-            logger.info(f"✓ Detected project: {self.project_name}")
-            logger.info(f"✓ Domain: {self.project_domain}")
-            logger.info(f"✓ Description: {description}")
+            self.apply_project_metadata(data)
             logger.info(f"✓ Cost: {format_cost(result['cost'])} | Time: {format_duration(result['duration'])} | Tokens: {result['total_tokens']:,}")
             
             # Track cost
-            self.costs['metadata_detection']['cost'] = result['cost']
-            self.costs['metadata_detection']['time'] = result['duration']
-            self.costs['metadata_detection']['tokens'] = result['total_tokens']
+            self.record_step_cost('metadata_detection', result)
             
             return True
         else:
             logger.warning(f"⚠ Could not parse LLM response, using fallback")
-            self.project_name = self.repo_name.replace('-', ' ').title()
-            self.project_domain = "software"
+            self.use_fallback_metadata()
             return True
     
+    def save_deptrac_config(self, yaml_content, parsed_config):
+        """Write deptrac.yaml into the project and cache its parsed form"""
+        deptrac_config_path = self.project_dir / "deptrac.yaml"
+        atomic_write(deptrac_config_path, yaml_content)
+        self._deptrac_config = parsed_config
+        self._layer_regex_table = None
+
+        logger.info(f"✓ Generated deptrac.yaml for {self.project_name}")
+        logger.info(f"✓ Saved to {deptrac_config_path}")
+
     def check_deptrac_config(self):
         """Generate deptrac configuration using LLM"""
         logger.info("Analyzing project structure and generating deptrac.yaml...")
         
-        step_start = time.time()
-        
-        # Initialize LLM client
-        tracker = CostTracker(self.model)
-        llm = LLMClient(self.api_key, self.model, tracker)
-        
         # Generate config with LLM
-        success, yaml_content, gen_metrics = generate_deptrac_config_with_llm(
+        success, yaml_content, gen_metrics, parsed_config = generate_deptrac_config_with_llm(
             project_dir=str(self.project_dir),
             project_name=self.project_name,
             domain=self.project_domain,
             repo_url=self.github_url,
-            llm_client=llm
+            llm_client=self.llm,
+            structure_cache=self.structure_cache
         )
             
         if not success or not yaml_content:
@@ -525,19 +1111,10 @@ Provide ONLY the JSON, no other text."""
             return False
         
         # Save generated config
-        deptrac_config_path = self.project_dir / "deptrac.yaml"
-        with open(deptrac_config_path, 'w') as f:
-            f.write(yaml_content)
-
-        logger.info(f"✓ Generated deptrac.yaml for {self.project_name}")
-        logger.info(f"✓ Saved to {deptrac_config_path}")
-        
-        step_time = time.time() - step_start
+        self.save_deptrac_config(yaml_content, parsed_config)
         
         # Track metrics
-        self.costs['deptrac_generation']['cost'] = gen_metrics.get('cost', 0)
-        self.costs['deptrac_generation']['time'] = gen_metrics.get('duration', 0)
-        self.costs['deptrac_generation']['tokens'] = gen_metrics.get('total_tokens', 0)
+        self.record_step_cost('deptrac_generation', gen_metrics)
 
         logger.info(f"✓ Cost: ${gen_metrics.get('cost', 0):.5f} | Time: {gen_metrics.get('duration', 0):.1f}s | Tokens: {gen_metrics.get('total_tokens', 0):,}")
         
@@ -552,14 +1129,21 @@ Provide ONLY the JSON, no other text."""
             'mail', 'notification', 'components', 'modules'
         ]
         
-        found_dirs = []
-        for dir_name in potential_dirs:
-            dir_path = self.project_dir / dir_name
-            if dir_path.exists() and dir_path.is_dir():
-                # Check if it contains PHP files
-                php_files = list(dir_path.glob('**/*.php'))
-                if php_files:
-                    found_dirs.append(dir_name)
+        tracked = git_list_php_files(self.project_dir)
+        if tracked is not None:
+            # Git checkout: top-level directories holding tracked PHP files
+            php_dirs = {p.split('/', 1)[0] for p in tracked if '/' in p}
+            found_dirs = [d for d in potential_dirs if d in php_dirs]
+        else:
+            # One scandir of the project root instead of an is_dir() stat per candidate
+            try:
+                with os.scandir(self.project_dir) as it:
+                    top_dirs = {entry.name for entry in it if entry.is_dir()}
+            except OSError:
+                top_dirs = set()
+            # Check if each candidate contains PHP files (short-circuits on first match)
+            found_dirs = [d for d in potential_dirs
+                          if d in top_dirs and _has_php_files(self.project_dir / d)]
         
         # Default if nothing found
         if not found_dirs:
@@ -590,12 +1174,11 @@ Provide ONLY the JSON, no other text."""
         if deptrac_output.exists():
             # Verify it's valid JSON
             try:
-                with open(deptrac_output, 'r') as f:
-                    data = json.load(f)
+                file_count = count_report_files(deptrac_output)
                 logger.info(f"✓ Deptrac analysis complete: {deptrac_output}")
-                logger.info(f"  Found {len(data.get('files', {}))} files with violations")
+                logger.info(f"  Found {file_count} files with violations")
                 return True
-            except json.JSONDecodeError:
+            except ValueError:
                 logger.error(f"✗ Deptrac report exists but is invalid JSON")
                 return False
         else:
@@ -618,7 +1201,7 @@ Provide ONLY the JSON, no other text."""
         return self.run_script("c4-architecture-review.py", args, "Architecture review")
 
     def run_script(self, script_name, args, step_name):
-        """Run a Python script and capture output"""
+        """Run a Python script, streaming its output"""
         scripts_dir = Path(__file__).parent
         script_path = scripts_dir / script_name
 
@@ -635,33 +1218,26 @@ Provide ONLY the JSON, no other text."""
         logger.info(f"Running: {script_name}")
         #logger.info(f"Command: {' '.join(cmd_list)}")  # Just for display
         # Better display with proper quoting
-        import shlex
         logger.debug(f"Command: {' '.join(shlex.quote(str(x)) for x in cmd_list)}")
 
-        try:
-            result = subprocess.run(
-                cmd_list,  # Pass as list, not string!
-                capture_output=True,
-                text=True,
-                timeout=1800
-            )
-            
-            if result.returncode == 0:
-                logger.info(f"✓ {step_name} complete")
-                return True
-            else:
-                logger.error(f"✗ {step_name} failed")
-                logger.error(f"STDOUT: {result.stdout}")
-                logger.error(f"STDERR: {result.stderr}")
-                if result.stderr:
-                    logger.error(f"Error: {result.stderr}")
-                return False
-        except subprocess.TimeoutExpired:
-            logger.error(f"✗ {step_name} timed out")
-            return False
-        except Exception as e:
-            logger.error(f"✗ {step_name} error: {e}")
-            return False
+        # Generator scripts share this run's LLM cache (or have it disabled)
+        env = os.environ.copy()
+        if self.llm_cache_dir is not None:
+            env['FLOWSCRIBE_LLM_CACHE_DIR'] = str(self.llm_cache_dir)
+        else:
+            env.pop('FLOWSCRIBE_LLM_CACHE_DIR', None)
+
+        # Output is streamed live by run_command, so only stderr is repeated on failure
+        success, _, stderr = self.run_command(cmd_list, env=env)
+
+        if success:
+            logger.info(f"✓ {step_name} complete")
+            return True
+
+        logger.error(f"✗ {step_name} failed")
+        if stderr:
+            logger.error(f"Error: {stderr}")
+        return False
     
     def generate_level1(self):
         """Generate C4 Level 1"""
@@ -686,8 +1262,29 @@ Provide ONLY the JSON, no other text."""
         
         return self.run_script("c4-level2-generator.py", args, "Level 2 generation")
     
+    def scan_layers(self):
+        """
+        Load the deptrac layer definitions and collect each layer's PHP files.
+
+        Returns:
+            Tuple of (layer names, dict mapping layer name to PHP file paths,
+            dict mapping layer name to its directory-collector file count)
+        """
+        # Reuse the config parsed in step 2; only read the file if it wasn't validated
+        deptrac_config = self._deptrac_config
+        if deptrac_config is None:
+            deptrac_config = load_yaml_file(self.project_dir / "deptrac.yaml")
+
+        layers = deptrac_config.get('deptrac', {}).get('layers', [])
+        if self._layer_regex_table is None:
+            self._layer_regex_table = compile_layer_patterns(layers)
+        layer_files = collect_layer_files(self.project_dir, layers, self._layer_regex_table)
+        counts = count_directory_collector_files(layers, layer_files)
+        return [layer['name'] for layer in layers], layer_files, counts
+
     def generate_level3(self, layer_name):
         """Generate C4 Level 3 for a specific layer"""
+        logger.info(f"\nGenerating {layer_name} layer...")
         args = [
             str(self.output_dir / "deptrac-report.json"),
             "--project", self.project_name,
@@ -695,6 +1292,9 @@ Provide ONLY the JSON, no other text."""
             "--layer", layer_name,
             "--output", str(self.output_dir / f"c4-level3-{layer_name.lower()}.md")
         ]
+        if self._layer_files is not None:
+            # Reuse the files collected in step 6 instead of re-scanning the project
+            args += ["--layer-files", str(self.layer_files_path)]
         
         return self.run_script("c4-level3-generator.py", args, f"Level 3 ({layer_name})")
     
@@ -785,8 +1385,7 @@ Provide ONLY the JSON, no other text."""
             'breakdown': self.costs
         }
         
-        with open(metrics_file, 'w') as f:
-            json.dump(metrics_data, f, indent=2)
+        save_json_file(metrics_file, metrics_data)
 
         logger.info(f"Metrics saved to: {metrics_file}")
         logger.info("")
@@ -802,6 +1401,9 @@ Provide ONLY the JSON, no other text."""
         
         # Create output directory
         self.output_dir.mkdir(parents=True, exist_ok=True)
+
+        # Start a fresh per-step metrics log for this run
+        self.metrics_log.unlink(missing_ok=True)
         
         # Start timing
         self.start_time = time.time()
@@ -811,107 +1413,111 @@ Provide ONLY the JSON, no other text."""
         if not self.check_project_exists():
             return False
         
-        # Step 2: Detect Project Metadata
-        self.print_step(2, 8, "Detect Project Metadata")
-        if not self.detect_project_metadata():
-            return False
-        
-        # Step 3: Generate Deptrac Config
-        self.print_step(3, 8, "Generate Deptrac Configuration")
-        if not self.check_deptrac_config():
+        # Step 2: Detect Project Metadata + Generate Deptrac Config (one LLM call)
+        self.print_step(2, 8, "Detect Project Metadata & Generate Deptrac Configuration")
+        if not self.analyze_project():
             return False
         
-        # Step 4: Run Deptrac Analysis
-        self.print_step(4, 8, "Run Deptrac Analysis")
+        # Step 6 needs every layer's PHP files: collect them in the background so
+        # the walk overlaps deptrac and the Level 1/2 LLM calls
+        deptrac_yaml = self.project_dir / "deptrac.yaml"
+        layer_scan = None
+        if self._deptrac_config is not None or deptrac_yaml.exists():
+            executor = ThreadPoolExecutor(max_workers=1)
+            layer_scan = executor.submit(self.scan_layers)
+            executor.shutdown(wait=False)
+
+        # Step 3: Run Deptrac Analysis
+        self.print_step(3, 8, "Run Deptrac Analysis")
         if not self.run_deptrac_analysis():
             return False
         
-        # Step 5: Generate C4 Level 1
-        self.print_step(5, 8, "Generate C4 Level 1 (System Context)")
-        if not self.generate_level1():
-            logger.warning("⚠ Level 1 generation failed, but continuing...")
-        
-        # Step 6: Generate C4 Level 2
-        self.print_step(6, 8, "Generate C4 Level 2 (Containers)")
-        if not self.generate_level2():
+        # Step 4: Generate C4 Level 1 (in the background; it only needs the project
+        # metadata, so its LLM round-trip overlaps Level 2)
+        self.print_step(4, 8, "Generate C4 Level 1 (System Context)")
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            level1 = executor.submit(self.generate_level1)
+
+            # Step 5: Generate C4 Level 2
+            self.print_step(5, 8, "Generate C4 Level 2 (Containers)")
+            level2_ok = self.generate_level2()
+
+            if not level1.result():
+                logger.warning("⚠ Level 1 generation failed, but continuing...")
+        if not level2_ok:
             return False
         
-        # Step 7: Generate C4 Level 3 (all layers)
-        self.print_step(7, 8, "Generate C4 Level 3 (Components)")
+        # Step 6: Generate C4 Level 3 (all layers)
+        self.print_step(6, 8, "Generate C4 Level 3 (Components)")
 
         # First, Check which layers actually have components
         logger.info("\nChecking which layers have components...")
         deptrac_json = self.output_dir / "deptrac-report.json"
-        deptrac_yaml = self.project_dir / "deptrac.yaml"
         layers_to_generate = []
+        # Default layer set, replaced by the config's layers once they are known
+        all_layers = ['Presentation', 'Infrastructure', 'Persistence', 'Domain']
 
-        try:
-            # Read the deptrac config to get layer definitions
-            import yaml
-            with open(deptrac_yaml, 'r') as f:
-                deptrac_config = yaml.safe_load(f)
+        if layer_scan is None:
+            # Nothing to match layers against: no filesystem walk was started
+            logger.warning(f"⚠ deptrac.yaml not found, skipping layer analysis")
+            layers_to_generate = all_layers
+        else:
+            try:
+                # Wait for the layer walk started after step 2
+                all_layers, self._layer_files, layer_counts = layer_scan.result()
+                logger.info(f"Layers defined: {', '.join(all_layers)}")
+                save_json_file(self.layer_files_path, self._layer_files, indent=False)
+
+                # Report all layer counts in one log call rather than one write per layer
+                progress_lines = []
+                for layer_name, count in layer_counts.items():
+                    if count > 0:
+                        layers_to_generate.append(layer_name)
+                        progress_lines.append(f"  ✓ {layer_name}: {count} PHP files")
+                    else:
+                        progress_lines.append(f"  ⊘ {layer_name}: 0 PHP files (skipping)")
+                if progress_lines:
+                    logger.info("\n".join(progress_lines))
+
+            except Exception as e:
+                logger.warning(f"⚠ Could not analyze layers: {e}", exc_info=True)
+                # Fallback: generate all layers
+                layers_to_generate = all_layers
+
+        if not layers_to_generate:
+            # A config whose layers match no files would only waste the remaining LLM calls
+            logger.error("✗ No layers matched any PHP files; aborting before Level 4 and review LLM calls")
+            logger.error("  Check the collectors in deptrac.yaml against the project layout")
+            return False
 
-            all_layers = [layer['name'] for layer in deptrac_config.get('deptrac', {}).get('layers', [])]
-            logger.info(f"Layers defined: {', '.join(all_layers)}")
-            
-            # For each layer, count PHP files matching its collectors
-            layer_counts = {}
-            for layer_def in deptrac_config.get('deptrac', {}).get('layers', []):
-                layer_name = layer_def['name']
-                count = 0
-                
-                # Get directory patterns from collectors
-                for collector in layer_def.get('collectors', []):
-                    if collector.get('type') == 'directory':
-                        pattern = collector.get('value', '')
-                        # Convert deptrac pattern to glob pattern
-                        # e.g., 'wp-admin/.*' -> 'wp-admin/**/*.php'
-                        dir_pattern = pattern.replace('/.*', '/**/*.php').replace('.*', '**/*.php')
-                        
-                        # Count PHP files matching this pattern
-                        from pathlib import Path
-                        for php_file in Path(self.project_dir).glob(dir_pattern):
-                            if php_file.is_file() and 'vendor' not in str(php_file) and 'test' not in str(php_file).lower():
-                                count += 1
-                
-                layer_counts[layer_name] = count
-                if count > 0:
-                    layers_to_generate.append(layer_name)
-                    logger.info(f"  ✓ {layer_name}: {count} PHP files")
-                else:
-                    logger.info(f"  ⊘ {layer_name}: 0 PHP files (skipping)")
+        logger.info(f"\nGenerating {len(layers_to_generate)} layers...")
 
-        except Exception as e:
-            logger.warning(f"⚠ Could not analyze layers: {e}")
-            import traceback
-            traceback.print_exc()
-            # Fallback: generate all layers
-            layers_to_generate = all_layers if 'all_layers' in locals() else ['Presentation', 'Infrastructure', 'Persistence', 'Domain']
+        # Step 7: Generate C4 Level 4 alongside Level 3; both only need the deptrac
+        # report, and only the architecture review reads their output
+        self.print_step(7, 8, "Generate C4 Level 4 (Code)")
+        # Level 4 and the layers are independent child processes; one bounded pool
+        # runs at most GENERATOR_MAX_WORKERS of them at a time, Level 4 first
+        with ThreadPoolExecutor(max_workers=min(GENERATOR_MAX_WORKERS, len(layers_to_generate) + 1)) as executor:
+            level4 = executor.submit(self.generate_level4)
+            level3 = [executor.submit(self.generate_level3, layer) for layer in layers_to_generate]
 
-        logger.info(f"\nGenerating {len(layers_to_generate)} layers...")
+            for layer, future in zip(layers_to_generate, level3):
+                if not future.result():
+                    logger.warning(f"⚠ {layer} layer generation failed, but continuing...")
 
-        for layer in layers_to_generate:
-            logger.info(f"\nGenerating {layer} layer...")
-            if not self.generate_level3(layer):
-                logger.warning(f"⚠ {layer} layer generation failed, but continuing...")
-        
-        # Step 8: Generate C4 Level 4
-        self.print_step(8, 8, "Generate C4 Level 4 (Code)")
-        if not self.generate_level4():
-            logger.warning("⚠ Level 4 generation failed, but continuing...")
+            if not level4.result():
+                logger.warning("⚠ Level 4 generation failed, but continuing...")
 
-        # Step 9: Generate Architecture Review
-        self.print_step(9, 9, "Generate Architecture Review")
+        # Step 8: Generate Architecture Review
+        self.print_step(8, 8, "Generate Architecture Review")
         if not self.generate_architecture_review():
             logger.warning("⚠ Architecture review failed, but continuing...")
 
-        # Step 10: Generate Master Index
+        # Step 9: Generate Master Index
         logger.info("\nGenerating Master Index...")
         if not self.generate_master_index():
             logger.warning("⚠ Master index generation failed")
 
-
-
         # Post-process: sanitize filenames and fix links (no spaces)
         try:
             logger.info('\nSanitizing output filenames and fixing links...')
@@ -932,9 +1538,9 @@ def main():
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog="""
 Examples:
-  # First, manually clone the repository
+  # First, manually clone the repository (a shallow clone is enough)
   cd /workspace/projects
-  git clone https://github.com/pkp/ojs
+  git clone --depth 1 https://github.com/pkp/ojs
   
   # Then analyze it
   python3 flowscribe-analyze.py https://github.com/pkp/ojs
@@ -977,6 +1583,13 @@ Prerequisites:
         help='Model to use (default: claude-sonnet-4-20250514)'
     )
 
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Always call the LLM instead of reusing cached responses from earlier runs '
+             '(same as FLOWSCRIBE_LLM_CACHE=0)'
+    )
+
     args = parser.parse_args()
 
     # Get API key from environment only
@@ -992,7 +1605,8 @@ Prerequisites:
         workspace_dir=args.workspace,
         output_base_dir=args.output,
         api_key=api_key,
-        model=args.model
+        model=args.model,
+        use_cache=not args.no_cache and os.environ.get('FLOWSCRIBE_LLM_CACHE') != '0'
     )
     
     # Run analysis
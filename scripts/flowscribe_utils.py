@@ -12,22 +12,66 @@ import os
 import json
 import time
 import re
-import hashlib
-from datetime import datetime
-from typing import Optional, Dict, Any, List
+import threading
+from types import MappingProxyType
+from typing import Optional, Dict, Any, List, Tuple
 import requests
 from logger import setup_logger
+from llm_cache import LLMCache
 from constants import (
     MAX_RESPONSE_SIZE,
+    MAX_RESPONSE_BODY_SIZE,
+    RESPONSE_CHUNK_SIZE,
     DEFAULT_API_TIMEOUT,
     DEFAULT_MODEL,
     DEFAULT_INPUT_COST,
-    DEFAULT_OUTPUT_COST
+    DEFAULT_OUTPUT_COST,
+    IGNORED_DIRS,
+    IGNORED_PATHS,
+    TEST_DIRS
 )
 
+# Optional: orjson is a faster drop-in for JSON (de)serialization
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional: PyYAML, preferring the libyaml-backed C loader
+try:
+    import yaml
+    try:
+        from yaml import CSafeLoader as YamlSafeLoader
+    except ImportError:
+        from yaml import SafeLoader as YamlSafeLoader
+except ImportError:
+    yaml = None
+    YamlSafeLoader = None
+
+# Parsed YAML documents keyed by path, valid while (mtime_ns, size) matches
+_yaml_cache: Dict[str, Tuple[Tuple[int, int], Any]] = {}
+
 # Setup module logger
 logger = setup_logger(__name__)
 
+OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
+
+# Model names may contain alphanumerics, hyphens, slashes, dots, and underscores
+_MODEL_NAME_RE = re.compile(r'[a-zA-Z0-9._/-]+')
+
+# Built-in pricing for common models, USD per 1M tokens (as of Oct 2025)
+PRICING_DB = MappingProxyType({
+    'anthropic/claude-sonnet-4-20250514': {'input': 3.0, 'output': 15.0},
+    'anthropic/claude-sonnet-4': {'input': 3.0, 'output': 15.0},
+    'anthropic/claude-opus-4': {'input': 15.0, 'output': 75.0},
+    'openai/gpt-4-turbo': {'input': 10.0, 'output': 30.0},
+    'openai/gpt-4': {'input': 30.0, 'output': 60.0},
+    'openai/gpt-4o': {'input': 2.5, 'output': 10.0},
+    'x-ai/grok-2': {'input': 2.0, 'output': 10.0},
+    'x-ai/grok-code-fast-1': {'input': 0.5, 'output': 1.5},
+    'google/gemini-pro-1.5': {'input': 1.25, 'output': 5.0},
+})
+
 
 class CostTracker:
     """Track costs and time for LLM operations"""
@@ -41,6 +85,10 @@ class CostTracker:
         self.total_output_tokens = 0
         self.total_tokens = 0
         self.calls: List[Dict[str, Any]] = []
+        # One tracker is shared by every call of a run, possibly across threads
+        self._lock = threading.Lock()
+        # (filepath, number of calls) of the last save_to_file, to skip no-op rewrites
+        self._last_saved: Optional[Tuple[str, int]] = None
 
     def _get_model_pricing(self, model: str) -> Dict[str, Any]:
         """Get pricing for model from environment or built-in database"""
@@ -66,22 +114,9 @@ class CostTracker:
                 'source': 'environment (unified)'
             }
         
-        # Built-in pricing for common models (as of Oct 2025)
-        pricing_db = {
-            'anthropic/claude-sonnet-4-20250514': {'input': 3.0, 'output': 15.0},
-            'anthropic/claude-sonnet-4': {'input': 3.0, 'output': 15.0},
-            'anthropic/claude-opus-4': {'input': 15.0, 'output': 75.0},
-            'openai/gpt-4-turbo': {'input': 10.0, 'output': 30.0},
-            'openai/gpt-4': {'input': 30.0, 'output': 60.0},
-            'openai/gpt-4o': {'input': 2.5, 'output': 10.0},
-            'x-ai/grok-2': {'input': 2.0, 'output': 10.0},
-            'x-ai/grok-code-fast-1': {'input': 0.5, 'output': 1.5},
-            'google/gemini-pro-1.5': {'input': 1.25, 'output': 5.0},
-        }
-        
-        if model in pricing_db:
-            pricing_db[model]['source'] = 'built-in'
-            return pricing_db[model]
+        entry = PRICING_DB.get(model)
+        if entry is not None:
+            return {**entry, 'source': 'built-in'}
         
         # Default pricing for unknown models
         logger.warning(f"Unknown model pricing for '{model}'")
@@ -109,15 +144,9 @@ class CostTracker:
     ) -> None:
         """Record an API call"""
         cost = float(cost_override) if cost_override is not None else self.calculate_cost(input_tokens, output_tokens)
-        
-        self.total_cost += cost
-        self.total_time += duration
-        self.total_input_tokens += input_tokens
-        self.total_output_tokens += output_tokens
-        self.total_tokens += (input_tokens + output_tokens)
-        
+
         entry = {
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': iso_utc(time.time()),
             'input_tokens': input_tokens,
             'output_tokens': output_tokens,
             'cost': cost,
@@ -125,7 +154,14 @@ class CostTracker:
         }
         if isinstance(meta, dict):
             entry.update(meta)
-        self.calls.append(entry)
+
+        with self._lock:
+            self.total_cost += cost
+            self.total_time += duration
+            self.total_input_tokens += input_tokens
+            self.total_output_tokens += output_tokens
+            self.total_tokens += (input_tokens + output_tokens)
+            self.calls.append(entry)
     
     def get_summary(self) -> Dict[str, Any]:
         """Get cost summary"""
@@ -159,17 +195,21 @@ class CostTracker:
         logger.info(f"{prefix}  API Calls:     {summary['num_calls']}")
     
     def save_to_file(self, filepath: str) -> None:
-        """Save metrics to JSON file"""
+        """Save metrics to JSON file (atomically; skipped if nothing changed since the last save)"""
+        saved = (os.fspath(filepath), len(self.calls))
+        if saved == self._last_saved and os.path.exists(saved[0]):
+            return
+
         summary = self.get_summary()
         summary['calls'] = self.calls
-        summary['generated_at'] = datetime.now().isoformat()
+        summary['generated_at'] = iso_utc(time.time())
 
         try:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(summary, f, indent=2)
+            save_json_file(filepath, summary)
         except (IOError, OSError) as e:
             logger.error(f"Failed to save metrics to {filepath}: {e}")
             raise
+        self._last_saved = saved
 
 
 class LLMClient:
@@ -179,7 +219,8 @@ class LLMClient:
         self,
         api_key: str,
         model: str,
-        tracker: Optional[CostTracker] = None
+        tracker: Optional[CostTracker] = None,
+        cache: Optional[LLMCache] = None
     ) -> None:
         self.api_key = api_key
 
@@ -188,12 +229,22 @@ class LLMClient:
             raise ValueError("Model must be a non-empty string")
 
         # Allow alphanumeric, hyphens, slashes, dots, and underscores in model names
-        if not re.match(r'^[a-zA-Z0-9._/-]+$', model):
+        if not _MODEL_NAME_RE.fullmatch(model):
             raise ValueError(f"Invalid model name format: {model}")
 
         self.model = model
         self.tracker = tracker or CostTracker(model)
-
+        # Optional on-disk response cache: identical prompts on reruns cost nothing
+        self.cache = cache
+        # Keep-alive session: reuses the TLS connection across calls and
+        # carries the static headers so they aren't rebuilt per request
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "HTTP-Referer": "https://github.com/flowscribe",
+            "X-Title": "Flowscribe"
+        })
 
     def call(
         self,
@@ -201,15 +252,18 @@ class LLMClient:
         timeout: int = DEFAULT_API_TIMEOUT
     ) -> Optional[Dict[str, Any]]:
         """Call OpenRouter API and track costs (usage-first)."""
-        url = "https://openrouter.ai/api/v1/chat/completions"
-        
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "https://github.com/flowscribe",
-            "X-Title": "Flowscribe"
-        }
-        
+        if self.cache is not None:
+            cached = self.cache.get(prompt, self.model)
+            if cached is not None:
+                logger.info("✓ Using cached LLM response")
+                # Keep cache hits in the call count, at no cost and no tokens
+                self.tracker.record_call(0, 0, 0.0, cost_override=0.0, meta={
+                    'id': cached.get('id'),
+                    'model': cached.get('model') or self.model,
+                    'cached': True
+                })
+                return {**cached, 'cost': 0.0, 'duration': 0.0, 'cached': True}
+
         payload = {
             "model": self.model,
             "messages": [{"role": "user", "content": prompt}],
@@ -218,15 +272,28 @@ class LLMClient:
         }
         
         start_time = time.time()
-        started_at = datetime.utcnow().isoformat() + "Z"
+        started_at = iso_utc(start_time)
         
         try:
-            response = requests.post(url, headers=headers, json=payload, timeout=timeout)
-            response.raise_for_status()
-            result = response.json()
-            
-            duration = time.time() - start_time
-            finished_at = datetime.utcnow().isoformat() + "Z"
+            response = self.session.post(OPENROUTER_API_URL, json=payload, timeout=timeout,
+                                         stream=True)
+            try:
+                response.raise_for_status()
+                # Security: Stop reading once the body exceeds the cap instead of
+                # buffering an arbitrarily large response before checking it
+                body = bytearray()
+                for chunk in response.iter_content(chunk_size=RESPONSE_CHUNK_SIZE):
+                    body += chunk
+                    if len(body) > MAX_RESPONSE_BODY_SIZE:
+                        logger.error(f"API response exceeded {MAX_RESPONSE_BODY_SIZE:,} bytes, aborting")
+                        return None
+            finally:
+                response.close()
+            result = orjson.loads(body) if orjson is not None else json.loads(body)
+
+            end_time = time.time()
+            duration = end_time - start_time
+            finished_at = iso_utc(end_time)
             
             # Extract content, usage, ids and model
             content = result.get('choices', [{}])[0].get('message', {}).get('content', '')
@@ -258,7 +325,7 @@ class LLMClient:
                 }
             )
             
-            return {
+            llm_result = {
                 'content': content,
                 'input_tokens': input_tokens,
                 'output_tokens': output_tokens,
@@ -271,6 +338,9 @@ class LLMClient:
                 'started_at': started_at,
                 'finished_at': finished_at
             }
+            if self.cache is not None:
+                self.cache.set(prompt, self.model, llm_result)
+            return llm_result
             
         except requests.exceptions.Timeout:
             logger.error(f"API request timed out after {timeout}s")
@@ -284,6 +354,20 @@ class LLMClient:
 
 
 
+def iso_utc(timestamp: float) -> str:
+    """Format an epoch timestamp as an ISO 8601 UTC string with a 'Z' suffix
+
+    Args:
+        timestamp: Seconds since the epoch, as returned by time.time()
+
+    Returns:
+        e.g. '2025-10-14T09:30:05.123456Z'
+    """
+    seconds = int(timestamp)
+    micros = int((timestamp - seconds) * 1_000_000)
+    return f"{time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(seconds))}.{micros:06d}Z"
+
+
 def parse_llm_json(response_text: str) -> Optional[Dict[str, Any]]:
     """Parse JSON from LLM response, handling markdown code blocks
 
@@ -297,6 +381,15 @@ def parse_llm_json(response_text: str) -> Optional[Dict[str, Any]]:
         logger.warning("Empty response text provided to parse_llm_json")
         return None
 
+    loads = orjson.loads if orjson is not None else json.loads
+
+    # Fast path: well-behaved responses are bare JSON (a fenced response
+    # fails at its first character and takes the cleanup path below)
+    try:
+        return loads(response_text)
+    except (TypeError, ValueError):
+        pass
+
     cleaned = response_text.strip()
 
     # Remove markdown code blocks
@@ -311,7 +404,8 @@ def parse_llm_json(response_text: str) -> Optional[Dict[str, Any]]:
     cleaned = cleaned.strip()
 
     try:
-        return json.loads(cleaned)
+        # orjson.JSONDecodeError subclasses json.JSONDecodeError
+        return loads(cleaned)
     except json.JSONDecodeError as e:
         logger.error(f"Failed to parse JSON: {e}")
         logger.debug(f"Response text:\n{response_text[:500]}")
@@ -321,6 +415,366 @@ def parse_llm_json(response_text: str) -> Optional[Dict[str, Any]]:
         return None
 
 
+def load_json_file(path: str) -> Any:
+    """Load a JSON document from file, using orjson when available
+
+    Args:
+        path: Path to JSON file
+
+    Returns:
+        Parsed JSON data
+
+    Raises:
+        json.JSONDecodeError: If the file is not valid JSON
+        OSError: If the file cannot be read
+    """
+    if orjson is not None:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_yaml_file(path: str) -> Any:
+    """Load a YAML document (safe loader), reusing the parse while the file is unchanged
+
+    Args:
+        path: Path to YAML file
+
+    Returns:
+        Parsed YAML data
+
+    Raises:
+        ImportError: If PyYAML is not installed
+        yaml.YAMLError: If the file is not valid YAML
+        OSError: If the file cannot be read
+    """
+    if yaml is None:
+        raise ImportError("PyYAML is required to read YAML files")
+
+    key = os.fspath(path)
+    st = os.stat(key)
+    signature = (st.st_mtime_ns, st.st_size)
+    cached = _yaml_cache.get(key)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    with open(key, 'r', encoding='utf-8') as f:
+        data = yaml.load(f, Loader=YamlSafeLoader)
+    _yaml_cache[key] = (signature, data)
+    return data
+
+
+def atomic_write(path: str, data: Any) -> None:
+    """Write data to path atomically via a sibling temp file and os.replace
+
+    Readers never observe a partially written file: a crash mid-write
+    leaves the previous content in place.
+
+    Args:
+        path: Destination file path
+        data: str (encoded as UTF-8) or bytes
+
+    Raises:
+        OSError: If the file cannot be written
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def save_json_file(path: str, data: Any, indent: bool = True) -> None:
+    """Write data to a JSON file atomically, using orjson when available
+
+    Args:
+        path: Destination file path
+        data: JSON-serializable data
+        indent: Pretty-print with 2-space indentation
+
+    Raises:
+        OSError: If the file cannot be written
+    """
+    if orjson is not None:
+        option = orjson.OPT_INDENT_2 if indent else 0
+        atomic_write(path, orjson.dumps(data, option=option))
+        return
+
+    atomic_write(path, json.dumps(data, indent=2 if indent else None))
+
+
+def append_jsonl(path: str, record: Dict[str, Any]) -> None:
+    """Append one record as a single JSON line to a JSONL file
+
+    Args:
+        path: Destination file path (created if missing)
+        record: JSON-serializable record
+
+    Raises:
+        OSError: If the file cannot be written
+    """
+    if orjson is not None:
+        line = orjson.dumps(record) + b"\n"
+    else:
+        line = (json.dumps(record) + "\n").encode('utf-8')
+
+    with open(path, 'ab') as f:
+        f.write(line)
+
+
+def deptrac_collector_regex(value: str) -> re.Pattern:
+    """Translate a deptrac directory collector value into a regex over PHP paths
+
+    Deptrac collector values are already regexes matched from the project
+    root, e.g. 'wp-admin/.*' becomes '^(?:wp-admin/.*).*\\.php$'. Values
+    that are not valid regexes are matched literally.
+
+    Args:
+        value: Collector value from deptrac.yaml
+
+    Returns:
+        Compiled pattern to match against relative POSIX paths
+    """
+    value = value[2:] if value.startswith('./') else value
+    try:
+        return re.compile(rf'^(?:{value}).*\.php$')
+    except re.error:
+        return re.compile(rf'^{re.escape(value)}.*\.php$')
+
+
+def deptrac_glob_regex(value: str) -> re.Pattern:
+    """Translate a deptrac glob collector value into a regex over relative paths
+
+    Follows Path.glob semantics: '*' and '?' stay within one path segment
+    and '**' spans directories, e.g. '*.php' only matches root-level files.
+
+    Args:
+        value: Collector value from deptrac.yaml
+
+    Returns:
+        Compiled pattern to match against relative POSIX paths
+    """
+    value = value[2:] if value.startswith('./') else value
+    regex = []
+    for token in re.split(r'(\*\*/|\*\*|\*|\?)', value):
+        if token == '**/':
+            regex.append('(?:.*/)?')
+        elif token == '**':
+            regex.append('.*')
+        elif token == '*':
+            regex.append('[^/]*')
+        elif token == '?':
+            regex.append('[^/]')
+        else:
+            regex.append(re.escape(token))
+    return re.compile('^' + ''.join(regex) + '$')
+
+
+def _combine_patterns(patterns: List[re.Pattern]) -> re.Pattern:
+    """Merge anchored patterns into one alternation (never matches if empty)"""
+    if not patterns:
+        return re.compile(r'(?!)')
+    return re.compile('|'.join(f'(?:{pattern.pattern})' for pattern in patterns))
+
+
+# Deptrac directory collectors are regexes; these characters end their literal part
+_REGEX_SPECIAL_CHARS = '.^$*+?{}[]\\|()'
+_GLOB_SPECIAL_CHARS = '*?['
+
+# ([(layer name, literal path prefixes, combined collector pattern)], walk roots)
+LayerTable = Tuple[List[Tuple[str, Tuple[str, ...], re.Pattern]], List[str]]
+
+
+def _literal_prefix(value: str, special: str) -> str:
+    """Return the leading part of a collector value that contains no wildcards
+
+    Args:
+        value: Collector value from deptrac.yaml (without a leading './')
+        special: Characters that start the non-literal part of the value
+
+    Returns:
+        Literal prefix of the value
+    """
+    for i, char in enumerate(value):
+        if char in special:
+            return value[:i]
+    return value
+
+
+def compile_layer_patterns(layers: List[Dict[str, Any]]) -> LayerTable:
+    """Compile deptrac layer collectors into a reusable matching table
+
+    The common 'some/dir/.*' directory collector is kept as a plain string
+    prefix (checked with str.startswith) instead of a regex.
+
+    Args:
+        layers: Layer definitions from deptrac.yaml ({'name': ..., 'collectors': [...]})
+
+    Returns:
+        Tuple of ([(layer name, literal path prefixes, combined pattern for
+        the remaining collectors)], directories to walk relative to the
+        project root, where '' means the whole project)
+    """
+    # Collectors with a literal directory prefix (e.g. 'wp-includes/.*') only
+    # need that subtree walked; any other collector requires the whole project
+    layer_table = []
+    roots = set()
+    for layer in layers:
+        prefixes = []
+        patterns = []
+        for collector in layer.get('collectors', []):
+            value = collector.get('value', '')
+            value = value[2:] if value.startswith('./') else value
+            if collector.get('type') == 'directory':
+                literal = _literal_prefix(value, _REGEX_SPECIAL_CHARS)
+                if value == literal + '.*':
+                    prefixes.append(literal)
+                else:
+                    patterns.append(deptrac_collector_regex(value))
+            elif collector.get('type') == 'glob':
+                literal = _literal_prefix(value, _GLOB_SPECIAL_CHARS)
+                patterns.append(deptrac_glob_regex(value))
+            else:
+                continue
+            roots.add(literal.rsplit('/', 1)[0] if '/' in literal else '')
+        layer_table.append((layer['name'], tuple(prefixes), _combine_patterns(patterns)))
+    return layer_table, sorted(roots)
+
+
+def _is_pruned_below(rel_root: str, root: str) -> bool:
+    """Check whether walking rel_root would prune a directory on the way to root."""
+    rel_dir = rel_root
+    for name in root[len(rel_root):].split('/'):
+        if name in IGNORED_DIRS or name.lower() in TEST_DIRS or rel_dir + name in IGNORED_PATHS:
+            return True
+        rel_dir += name + '/'
+    return False
+
+
+def collect_layer_files(project_dir: str, layers: List[Dict[str, Any]],
+                        layer_table: Optional[LayerTable] = None) -> Dict[str, List[str]]:
+    """Collect PHP files per deptrac layer in a single walk of the project
+
+    Collector values are compiled once and every PHP file is classified
+    against all layers, instead of globbing the tree once per collector.
+    Ignored, framework cache and test directories are pruned during the
+    walk. A configured collector root is walked even if it is an ignored
+    directory such as vendor/ or build/ (the original glob-based scan
+    skipped any path containing 'vendor'); only roots inside a test
+    directory are skipped. Symlinked directories are not followed and test
+    files are not collected.
+
+    Args:
+        project_dir: Path to project directory
+        layers: Layer definitions from deptrac.yaml ({'name': ..., 'collectors': [...]})
+        layer_table: Precompiled result of compile_layer_patterns(layers), if cached
+
+    Returns:
+        Dict mapping layer name to a list of PHP file paths relative to
+        project_dir (POSIX separators)
+    """
+    if layer_table is None:
+        layer_table = compile_layer_patterns(layers)
+    layer_matchers, roots = layer_table
+    layer_files = {name: [] for name, _, _ in layer_matchers}
+    # Files matching no layer are rejected by one prefix check and one C-level match
+    any_prefix = tuple(prefix for _, prefixes, _ in layer_matchers for prefix in prefixes)
+    any_pattern = _combine_patterns([pattern for _, _, pattern in layer_matchers])
+
+    project_dir = os.fspath(project_dir)
+    walk_roots = []
+    for root in roots:
+        if not root:
+            walk_roots.append((project_dir, ''))
+            continue
+        if any(root.startswith(walked) and not _is_pruned_below(walked, root)
+               for _, walked in walk_roots):
+            continue  # Nested under a root that is already walked
+        # Configured roots are walked even if they are named like an ignored
+        # directory, but like the walk, skip any root inside a test directory
+        if any(part.lower() in TEST_DIRS for part in root.split('/')):
+            continue
+        root_path = os.path.join(project_dir, root)
+        if os.path.isdir(root_path):
+            walk_roots.append((root_path, root + '/'))
+
+    for root_path, rel_root in walk_roots:
+        # os.walk classifies entries from scandir's d_type: no stat() per file,
+        # and unlike os.fwalk no extra open()/fstat() per directory
+        for dir_path, dirnames, filenames in os.walk(root_path):
+            sub_dir = dir_path[len(root_path) + 1:].replace(os.sep, '/')
+            rel_dir = f"{rel_root}{sub_dir}/" if sub_dir else rel_root
+            # Prune vendor, test, framework cache and other ignored directories
+            # so they are never scanned
+            dirnames[:] = [d for d in dirnames
+                           if d not in IGNORED_DIRS and d.lower() not in TEST_DIRS
+                           and rel_dir + d not in IGNORED_PATHS]
+            for name in filenames:
+                if not name.endswith('.php') or 'test' in name.lower():
+                    continue
+                rel_path = rel_dir + name
+                if not (rel_path.startswith(any_prefix) or any_pattern.match(rel_path)):
+                    continue
+                for layer_name, prefixes, pattern in layer_matchers:
+                    if rel_path.startswith(prefixes) or pattern.match(rel_path):
+                        layer_files[layer_name].append(rel_path)
+
+    return layer_files
+
+
+def count_directory_collector_files(layers: List[Dict[str, Any]],
+                                    layer_files: Dict[str, List[str]]) -> Dict[str, int]:
+    """Count each layer's collected files matched by its directory collectors
+
+    The analyzer decides which layers get a Level 3 run from these counts, so
+    as before layers with only glob collectors (e.g. root '*.php') are skipped
+    even though collect_layer_files returns their files to the generator.
+
+    Args:
+        layers: Layer definitions from deptrac.yaml ({'name': ..., 'collectors': [...]})
+        layer_files: Result of collect_layer_files(project_dir, layers)
+
+    Returns:
+        Dict mapping layer name to its number of directory-collector matches
+    """
+    directory_layers = [
+        {'name': layer['name'],
+         'collectors': [c for c in layer.get('collectors', []) if c.get('type') == 'directory']}
+        for layer in layers
+    ]
+    layer_matchers, _ = compile_layer_patterns(directory_layers)
+    return {
+        name: sum(1 for rel_path in layer_files.get(name, [])
+                  if rel_path.startswith(prefixes) or pattern.match(rel_path))
+        for name, prefixes, pattern in layer_matchers
+    }
+
+
+def llm_cache_from_env() -> Optional[LLMCache]:
+    """Open the LLM response cache shared by a Flowscribe run, if enabled
+
+    The analyzer exports FLOWSCRIBE_LLM_CACHE_DIR to the generator scripts it
+    starts; FLOWSCRIBE_LLM_CACHE=0 disables caching.
+
+    Returns:
+        LLMCache for the configured directory, or None if caching is off
+    """
+    cache_dir = os.environ.get('FLOWSCRIBE_LLM_CACHE_DIR')
+    if not cache_dir or os.environ.get('FLOWSCRIBE_LLM_CACHE') == '0':
+        return None
+    return LLMCache(cache_dir)
+
+
 def get_api_config() -> tuple[str, str]:
     """Get API configuration from environment
 
@@ -382,13 +836,24 @@ def format_duration(seconds: float) -> str:
 # Mermaid ID sanitization utils
 # -----------------------------
 
+# ASCII characters outside [A-Za-z0-9_] map to '_' (str.translate runs in C)
+_MERMAID_ID_TABLE = str.maketrans({
+    c: '_' for c in map(chr, range(128)) if not (c.isalnum() or c == '_')
+})
+_MERMAID_UNSAFE_RE = re.compile(r'[^A-Za-z0-9_]')
+
+
 def mermaid_safe_id(name: str) -> str:
     """
     Return a Mermaid-safe node id:
     - only [A-Za-z0-9_]
     - prefix with 'n_' if starts with a digit or becomes empty
     """
-    base = re.sub(r'[^A-Za-z0-9_]', '_', str(name or ''))
+    text = str(name or '')
+    if text.isascii():
+        base = text.translate(_MERMAID_ID_TABLE)
+    else:
+        base = _MERMAID_UNSAFE_RE.sub('_', text)
     if not base or base[0].isdigit():
         base = 'n_' + base
     return base
@@ -397,18 +862,26 @@ class MermaidIdRegistry:
     """
     Keeps node ids unique within a diagram while preserving readable labels.
     """
-    __slots__ = ('_used',)
+    __slots__ = ('_used', '_counts')
 
     def __init__(self):
         self._used = set()
+        # Last numeric suffix handed out per base id
+        self._counts = {}
 
     def uid(self, name: str) -> str:
         sid = mermaid_safe_id(name)
         if sid in self._used:
-            h = hashlib.md5(str(name).encode('utf-8')).hexdigest()[:6]
-            sid = f"{sid}_{h}"
+            base = sid
+            n = self._counts.get(base, 1)
+            # Skip suffixes already taken by a literal name like 'Component_2'
+            while sid in self._used:
+                n += 1
+                sid = f"{base}_{n}"
+            self._counts[base] = n
         self._used.add(sid)
         return sid
 
     def reset(self):
         self._used.clear()
+        self._counts.clear()
@@ -8,15 +8,33 @@ Can be used for Docker health checks, monitoring, and debugging.
 
 import sys
 import os
+import time
 from pathlib import Path
-from typing import Dict, List, Tuple, Any
+from typing import Dict, List, Optional, Tuple, Any
 import json
-import argparse
+import shutil
+from importlib.util import find_spec
+
+
+# Prefix of OpenRouter API keys
+API_KEY_PREFIX = 'sk-or-v1-'
+
+# Bytes of /proc/1/cgroup searched for Docker markers (the file is a few lines)
+CGROUP_READ_LIMIT = 8192
+
+# Seconds a shutil.disk_usage reading is reused by check_disk_space
+DISK_USAGE_TTL_SECONDS = 30.0
+
+# Environment variables read by the checks
+ENV_KEYS = ('OPENROUTER_API_KEY', 'FLOWSCRIBE_WORKSPACE', 'DOCKER_CONTAINER')
 
 
 class HealthCheck:
     """Comprehensive health check for Flowscribe."""
 
+    # Filesystem Docker detection result; container-ness can't change mid-process
+    _in_docker = None
+
     def __init__(self, verbose: bool = False):
         """
         Initialize health check.
@@ -26,6 +44,13 @@ class HealthCheck:
         """
         self.verbose = verbose
         self.results: Dict[str, Any] = {}
+        # (monotonic time, (total, used, free)) of the last disk usage probe
+        self._disk_usage: Optional[Tuple[float, Tuple[int, int, int]]] = None
+        self.refresh_env()
+
+    def refresh_env(self) -> None:
+        """Snapshot the environment variables the checks read."""
+        self._env = {key: os.environ.get(key) for key in ENV_KEYS}
 
     def check_python_version(self) -> Tuple[bool, str]:
         """
@@ -50,17 +75,18 @@ class HealthCheck:
         Returns:
             Tuple of (success, message)
         """
-        api_key = os.getenv('OPENROUTER_API_KEY')
+        api_key = self._env['OPENROUTER_API_KEY']
 
         if not api_key:
             return False, "OPENROUTER_API_KEY not set"
 
-        if not api_key.startswith('sk-or-v1-'):
+        if not api_key.startswith(API_KEY_PREFIX):
             return False, "Invalid API key format"
 
-        # Mask most of the key
-        masked_key = api_key[:12] + '...' + api_key[-4:] if len(api_key) > 16 else 'set'
-        return True, f"API key configured ({masked_key})"
+        # Mask most of the key (only built once the key is known to be valid)
+        if len(api_key) > 16:
+            return True, f"API key configured ({api_key[:12]}...{api_key[-4:]})"
+        return True, "API key configured (set)"
 
     def check_workspace(self) -> Tuple[bool, str]:
         """
@@ -71,7 +97,7 @@ class HealthCheck:
         """
         # Check common workspace locations
         possible_workspaces = [
-            os.getenv('FLOWSCRIBE_WORKSPACE'),
+            self._env['FLOWSCRIBE_WORKSPACE'],
             '/workspace',
             './projects',
             './workspace'
@@ -121,19 +147,17 @@ class HealthCheck:
             'matplotlib' # matplotlib
         ]
 
+        # find_spec only locates the package; importing it would run its
+        # module-level code (matplotlib alone sets up a backend)
         missing = []
         missing_optional = []
 
         for package in required_packages:
-            try:
-                __import__(package)
-            except ImportError:
+            if find_spec(package) is None:
                 missing.append(package)
 
         for package in optional_packages:
-            try:
-                __import__(package)
-            except ImportError:
+            if find_spec(package) is None:
                 missing_optional.append(package)
 
         if missing:
@@ -162,11 +186,13 @@ class HealthCheck:
             'c4-level4-generator.py',
         ]
 
-        missing = []
-        for script in required_scripts:
-            script_path = scripts_dir / script
-            if not script_path.exists():
-                missing.append(script)
+        # One directory listing instead of a stat() per script
+        try:
+            with os.scandir(scripts_dir) as it:
+                present = {entry.name for entry in it if entry.is_file()}
+        except OSError:
+            present = set()
+        missing = [script for script in required_scripts if script not in present]
 
         if missing:
             return False, f"Missing scripts: {', '.join(missing)}"
@@ -199,20 +225,45 @@ class HealthCheck:
         Returns:
             Tuple of (success, message)
         """
-        # Check for common Docker indicators
-        docker_indicators = [
-            Path('/.dockerenv').exists(),
-            os.getenv('DOCKER_CONTAINER') == 'true',
-            Path('/proc/1/cgroup').exists() and 'docker' in Path('/proc/1/cgroup').read_text()
-        ]
-
-        in_docker = any(docker_indicators)
+        # Check for common Docker indicators, cheapest first
+        in_docker = self._env['DOCKER_CONTAINER'] == 'true' or self._docker_files_present()
 
         if in_docker:
             return True, "Running in Docker container"
         else:
             return True, "Not running in Docker (OK for local development)"
 
+    @classmethod
+    def _docker_files_present(cls) -> bool:
+        """
+        Look for Docker markers on the filesystem (memoized for the process).
+
+        Returns:
+            True if /.dockerenv exists or PID 1's cgroup mentions docker
+        """
+        if cls._in_docker is None:
+            cls._in_docker = Path('/.dockerenv').exists() or cls._cgroup_mentions_docker()
+        return cls._in_docker
+
+    @staticmethod
+    def _cgroup_mentions_docker() -> bool:
+        """
+        Search PID 1's cgroup file for 'docker' without decoding it.
+
+        Returns:
+            True if the first CGROUP_READ_LIMIT bytes contain b'docker'
+        """
+        try:
+            fd = os.open('/proc/1/cgroup', os.O_RDONLY)
+        except OSError:
+            return False
+        try:
+            return b'docker' in os.read(fd, CGROUP_READ_LIMIT)
+        except OSError:
+            return False
+        finally:
+            os.close(fd)
+
     def check_disk_space(self) -> Tuple[bool, str]:
         """
         Check available disk space.
@@ -221,8 +272,10 @@ class HealthCheck:
             Tuple of (success, message)
         """
         try:
-            import shutil
-            total, used, free = shutil.disk_usage('/')
+            now = time.monotonic()
+            if self._disk_usage is None or now - self._disk_usage[0] >= DISK_USAGE_TTL_SECONDS:
+                self._disk_usage = (now, tuple(shutil.disk_usage('/')))
+            total, used, free = self._disk_usage[1]
 
             free_gb = free / (1024 ** 3)
             total_gb = total / (1024 ** 3)
@@ -235,10 +288,13 @@ class HealthCheck:
         except Exception as e:
             return False, f"Failed to check disk space: {e}"
 
-    def run_all_checks(self) -> Dict[str, Any]:
+    def run_all_checks(self, quick_check: bool = False) -> Dict[str, Any]:
         """
         Run all health checks.
 
+        Args:
+            quick_check: Skip the slower dependency and disk space probes
+
         Returns:
             Dictionary with check results
         """
@@ -253,6 +309,8 @@ class HealthCheck:
             ('docker_env', self.check_docker_env),
             ('disk_space', self.check_disk_space),
         ]
+        if quick_check:
+            checks = [check for check in checks if check[0] not in ('dependencies', 'disk_space')]
 
         results = {}
         all_passed = True
@@ -278,7 +336,6 @@ class HealthCheck:
             'timestamp': self._get_timestamp(),
             'checks': results
         }
-
         return self.results
 
     def _get_timestamp(self) -> str:
@@ -335,6 +392,9 @@ class HealthCheck:
 
 def main():
     """Main entry point."""
+    # Only the CLI needs argparse; library users of HealthCheck skip it
+    import argparse
+
     parser = argparse.ArgumentParser(
         description='Health check for Flowscribe'
     )
@@ -348,6 +408,11 @@ def main():
         action='store_true',
         help='Verbose output'
     )
+    parser.add_argument(
+        '--quick',
+        action='store_true',
+        help='Skip the dependency and disk space checks'
+    )
     parser.add_argument(
         '--exit-code',
         action='store_true',
@@ -357,7 +422,7 @@ def main():
     args = parser.parse_args()
 
     health = HealthCheck(verbose=args.verbose)
-    results = health.run_all_checks()
+    results = health.run_all_checks(quick_check=args.quick)
     health.print_results(json_output=args.json)
 
     # Exit with appropriate code
@@ -5,13 +5,34 @@ Provides caching functionality for LLM API responses to reduce costs
 and improve performance by avoiding redundant API calls.
 """
 
+import copy
 import hashlib
 import json
+import os
 import time
+from collections import OrderedDict
 from pathlib import Path
 from typing import Optional, Dict, Any
 from datetime import datetime, timedelta
 
+# Optional: orjson is a faster drop-in for JSON (de)serialization
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# How long a recorded miss is trusted, and how many misses are remembered
+NEGATIVE_TTL_SECONDS = 60.0
+MAX_NEGATIVE_ENTRIES = 4096
+# Decoded responses kept in memory, most recently used last
+MAX_HOT_ENTRIES = 256
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Strip trailing whitespace from each line and from the end of a prompt."""
+    return '\n'.join(line.rstrip() for line in prompt.rstrip().splitlines())
+
 
 class LLMCache:
     """Cache layer for LLM responses with TTL support."""
@@ -27,21 +48,35 @@ class LLMCache:
         self.cache_dir = Path(cache_dir)
         self.ttl_hours = ttl_hours
         self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Recent misses (cache key -> monotonic time), so repeated lookups of an
+        # absent key skip the filesystem; oldest entries are evicted first
+        self._misses: Dict[str, float] = {}
+        # Recently read or written entries (cache key -> (expiry epoch, response))
+        self._hot: "OrderedDict[str, tuple]" = OrderedDict()
 
     def get_cache_key(self, prompt: str, model: str, temperature: float = 0.0) -> str:
         """
         Generate cache key from prompt, model, and temperature.
 
+        Trailing whitespace is stripped from each line and from the end of the
+        prompt, so prompts that differ only there (e.g. a README snippet ending
+        in a newline) share an entry. Indentation and blank lines are kept, as
+        they can be significant (code, YAML).
+
         Args:
             prompt: The prompt text
             model: Model name/identifier
             temperature: Model temperature parameter
 
         Returns:
-            SHA256 hash as cache key
+            128-bit BLAKE2b hex digest as cache key
         """
-        content = f"{model}:{temperature}:{prompt}"
-        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+        # BLAKE2b is faster than SHA-256 without SHA extensions; 128 bits is
+        # ample for naming local cache files
+        hasher = hashlib.blake2b(digest_size=16)
+        hasher.update(f"{model}:{temperature}:".encode('utf-8'))
+        hasher.update(normalize_prompt(prompt).encode('utf-8'))
+        return hasher.hexdigest()
 
     def _get_cache_path(self, cache_key: str) -> Path:
         """Get file path for cache key."""
@@ -60,15 +95,30 @@ class LLMCache:
             Cached response dict or None if not found/expired
         """
         cache_key = self.get_cache_key(prompt, model, temperature)
-        cache_path = self._get_cache_path(cache_key)
-
-        if not cache_path.exists():
+        hot = self._hot.get(cache_key)
+        if hot is not None:
+            if time.time() < hot[0]:
+                self._hot.move_to_end(cache_key)
+                # Copy so callers mutating the response can't corrupt later hits
+                return copy.deepcopy(hot[1])
+            del self._hot[cache_key]
+
+        missed_at = self._misses.get(cache_key)
+        if missed_at is not None and time.monotonic() - missed_at < NEGATIVE_TTL_SECONDS:
             return None
 
+        cache_path = self._get_cache_path(cache_key)
         try:
             with open(cache_path, 'r', encoding='utf-8') as f:
                 cached_data = json.load(f)
+        except FileNotFoundError:
+            self._record_miss(cache_key)
+            return None
+        except (json.JSONDecodeError, OSError):
+            cache_path.unlink(missing_ok=True)
+            return None
 
+        try:
             # Check if cache is expired
             cached_time = datetime.fromisoformat(cached_data['timestamp'])
             expiry_time = cached_time + timedelta(hours=self.ttl_hours)
@@ -78,14 +128,29 @@ class LLMCache:
                 cache_path.unlink()
                 return None
 
-            return cached_data['response']
+            response = cached_data['response']
+            self._remember(cache_key, expiry_time.timestamp(), response)
+            return response
 
-        except (json.JSONDecodeError, KeyError, ValueError, OSError):
+        except (KeyError, TypeError, ValueError, OSError):
             # Invalid cache file, remove it
-            if cache_path.exists():
-                cache_path.unlink()
+            cache_path.unlink(missing_ok=True)
             return None
 
+    def _remember(self, cache_key: str, expires_at: float, response: Dict[str, Any]) -> None:
+        """Keep a private copy of a decoded response in the in-memory LRU."""
+        self._hot[cache_key] = (expires_at, copy.deepcopy(response))
+        self._hot.move_to_end(cache_key)
+        if len(self._hot) > MAX_HOT_ENTRIES:
+            self._hot.popitem(last=False)
+
+    def _record_miss(self, cache_key: str) -> None:
+        """Remember that cache_key was absent, evicting the oldest miss if full."""
+        self._misses.pop(cache_key, None)
+        if len(self._misses) >= MAX_NEGATIVE_ENTRIES:
+            del self._misses[next(iter(self._misses))]
+        self._misses[cache_key] = time.monotonic()
+
     def set(self, prompt: str, model: str, response: Dict[str, Any],
             temperature: float = 0.0) -> None:
         """
@@ -99,21 +164,60 @@ class LLMCache:
         """
         cache_key = self.get_cache_key(prompt, model, temperature)
         cache_path = self._get_cache_path(cache_key)
+        self._misses.pop(cache_key, None)
 
+        now = datetime.now()
+        self._remember(cache_key, (now + timedelta(hours=self.ttl_hours)).timestamp(), response)
         cache_data = {
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': now.isoformat(),
             'model': model,
             'temperature': temperature,
             'prompt_hash': cache_key,
             'response': response
         }
 
+        # Compact output: cache files are read by code, not people
+        if orjson is not None:
+            payload = orjson.dumps(cache_data)
+        else:
+            payload = json.dumps(cache_data, separators=(',', ':')).encode('utf-8')
+
+        # Write to a per-process temp file and rename, so concurrent readers
+        # never see a partially written entry
+        tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
         try:
-            with open(cache_path, 'w', encoding='utf-8') as f:
-                json.dump(cache_data, f, indent=2)
-        except OSError as e:
-            # Log error but don't fail - caching is optional
+            tmp_path.write_bytes(payload)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            # Don't fail - caching is optional
+            tmp_path.unlink(missing_ok=True)
+
+    def _scan_entries(self, with_stat: bool = True):
+        """
+        List cache files, optionally with their stat results.
+
+        Uses os.scandir so no Path object is built per entry, and skips the
+        stat() call entirely when only the paths are needed.
+
+        Args:
+            with_stat: Include each entry's stat result (None otherwise)
+
+        Returns:
+            List of (path, stat_result) tuples for *.json entries
+        """
+        entries = []
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if not entry.name.endswith('.json'):
+                        continue
+                    try:
+                        entries.append((entry.path, entry.stat() if with_stat else None))
+                    except OSError:
+                        continue
+        except OSError:
             pass
+        return entries
 
     def clear_expired(self) -> int:
         """
@@ -123,23 +227,18 @@ class LLMCache:
             Number of entries removed
         """
         removed_count = 0
-
-        for cache_file in self.cache_dir.glob('*.json'):
-            try:
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    cached_data = json.load(f)
-
-                cached_time = datetime.fromisoformat(cached_data['timestamp'])
-                expiry_time = cached_time + timedelta(hours=self.ttl_hours)
-
-                if datetime.now() > expiry_time:
-                    cache_file.unlink()
+        self._hot.clear()
+        # set() writes each file when its entry is created, so the mtime
+        # stands in for the stored timestamp without parsing the JSON
+        cutoff = time.time() - self.ttl_hours * 3600
+
+        for path, st in self._scan_entries():
+            if st.st_mtime < cutoff:
+                try:
+                    os.unlink(path)
                     removed_count += 1
-
-            except (json.JSONDecodeError, KeyError, ValueError, OSError):
-                # Invalid cache file, remove it
-                cache_file.unlink()
-                removed_count += 1
+                except OSError:
+                    pass
 
         return removed_count
 
@@ -151,10 +250,12 @@ class LLMCache:
             Number of entries removed
         """
         removed_count = 0
+        self._hot.clear()
+        self._misses.clear()
 
-        for cache_file in self.cache_dir.glob('*.json'):
+        for path, _ in self._scan_entries(with_stat=False):
             try:
-                cache_file.unlink()
+                os.unlink(path)
                 removed_count += 1
             except OSError:
                 pass
@@ -172,21 +273,12 @@ class LLMCache:
         expired_entries = 0
         total_size_bytes = 0
 
-        for cache_file in self.cache_dir.glob('*.json'):
-            total_entries += 1
-            total_size_bytes += cache_file.stat().st_size
+        cutoff = time.time() - self.ttl_hours * 3600
 
-            try:
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    cached_data = json.load(f)
-
-                cached_time = datetime.fromisoformat(cached_data['timestamp'])
-                expiry_time = cached_time + timedelta(hours=self.ttl_hours)
-
-                if datetime.now() > expiry_time:
-                    expired_entries += 1
-
-            except (json.JSONDecodeError, KeyError, ValueError, OSError):
+        for _, st in self._scan_entries():
+            total_entries += 1
+            total_size_bytes += st.st_size
+            if st.st_mtime < cutoff:
                 expired_entries += 1
 
         return {
@@ -6,9 +6,17 @@ Provides structured logging with configurable levels and JSON output support.
 """
 import logging
 import sys
-import json
-from datetime import datetime
-from typing import Optional, Dict, Any
+import time
+from typing import Optional, Dict, Any, Callable
+
+# Standard LogRecord attributes, excluded from JSONFormatter's 'extra' fields
+STANDARD_RECORD_KEYS = frozenset({
+    'name', 'msg', 'args', 'created', 'filename', 'funcName',
+    'levelname', 'levelno', 'lineno', 'module', 'msecs',
+    'message', 'pathname', 'process', 'processName',
+    'relativeCreated', 'thread', 'threadName', 'exc_info',
+    'exc_text', 'stack_info', 'getMessage', 'taskName'
+})
 
 
 def setup_logger(name: str, level: int = logging.INFO) -> logging.Logger:
@@ -58,6 +66,39 @@ def set_debug_mode(logger: logging.Logger, debug: bool = True) -> None:
         handler.setLevel(level)
 
 
+def _json_serializer() -> Callable[[Dict[str, Any]], str]:
+    """
+    Pick the JSON serializer for log records.
+
+    Imported here rather than at module top so scripts that only use the
+    text logger from setup_logger don't load json/orjson for it. Prefers
+    orjson when installed; default=str keeps records with non-serializable
+    extra values loggable. Records orjson still rejects (e.g. integers
+    beyond 64 bits) fall back to json.dumps. orjson writes compact JSON
+    (no spaces after ',' and ':'), json.dumps the spaced default.
+
+    Returns:
+        Function serializing a dict to a JSON string
+    """
+    import json
+
+    def dumps_json(data: Dict[str, Any]) -> str:
+        return json.dumps(data, default=str)
+
+    try:
+        import orjson
+    except ImportError:
+        return dumps_json
+
+    def dumps_orjson(data: Dict[str, Any]) -> str:
+        try:
+            return orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        except TypeError:
+            return dumps_json(data)
+
+    return dumps_orjson
+
+
 class JSONFormatter(logging.Formatter):
     """
     JSON formatter for structured logging.
@@ -74,6 +115,26 @@ class JSONFormatter(logging.Formatter):
         """
         super().__init__()
         self.include_extra = include_extra
+        self._dumps = _json_serializer()
+        # (epoch second, formatted local time) of the last record; replaced as a
+        # whole tuple so concurrent handlers at worst re-format once
+        self._second_cache = (None, '')
+
+    def _format_timestamp(self, created: float) -> str:
+        """Format an epoch time exactly like datetime.fromtimestamp(created).isoformat(),
+        re-formatting the date/time part only when the second changes."""
+        second = int(created)
+        # fromtimestamp rounds half-to-even to the microsecond, carrying into the second
+        micros = round((created - second) * 1_000_000)
+        if micros >= 1_000_000:
+            second += 1
+            micros -= 1_000_000
+        cached_second, prefix = self._second_cache
+        if cached_second != second:
+            prefix = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(second))
+            self._second_cache = (second, prefix)
+        # isoformat() omits the fraction when it is zero
+        return f"{prefix}.{micros:06d}" if micros else prefix
 
     def format(self, record: logging.LogRecord) -> str:
         """
@@ -86,7 +147,7 @@ class JSONFormatter(logging.Formatter):
             JSON-formatted log string
         """
         log_data: Dict[str, Any] = {
-            'timestamp': datetime.fromtimestamp(record.created).isoformat(),
+            'timestamp': self._format_timestamp(record.created),
             'level': record.levelname,
             'logger': record.name,
             'message': record.getMessage(),
@@ -97,7 +158,11 @@ class JSONFormatter(logging.Formatter):
 
         # Add exception info if present
         if record.exc_info:
-            log_data['exception'] = self.formatException(record.exc_info)
+            # Like logging.Formatter, cache the traceback text on the record so
+            # other handlers don't format it again
+            if not record.exc_text:
+                record.exc_text = self.formatException(record.exc_info)
+            log_data['exception'] = record.exc_text
 
         # Add stack info if present
         if record.stack_info:
@@ -105,25 +170,16 @@ class JSONFormatter(logging.Formatter):
 
         # Add extra fields if requested
         if self.include_extra:
-            # Standard LogRecord attributes to exclude
-            exclude_keys = {
-                'name', 'msg', 'args', 'created', 'filename', 'funcName',
-                'levelname', 'levelno', 'lineno', 'module', 'msecs',
-                'message', 'pathname', 'process', 'processName',
-                'relativeCreated', 'thread', 'threadName', 'exc_info',
-                'exc_text', 'stack_info', 'getMessage', 'taskName'
-            }
-
             # Add any extra fields
             extra_fields = {
                 k: v for k, v in record.__dict__.items()
-                if k not in exclude_keys and not k.startswith('_')
+                if k not in STANDARD_RECORD_KEYS and not k.startswith('_')
             }
 
             if extra_fields:
                 log_data['extra'] = extra_fields
 
-        return json.dumps(log_data)
+        return self._dumps(log_data)
 
 
 def setup_json_logger(
@@ -13,15 +13,20 @@ Usage:
 """
 from pathlib import Path
 import argparse
+import json
+import os
 import re
 import sys
-import shutil
 import hashlib
-from typing import Dict, List
+from typing import Any, Dict, List
 from logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# Records {relative path: mtime_ns} of files already sanitized, so re-runs only
+# reprocess Markdown that was (re)generated since
+MANIFEST_NAME = ".sanitize-manifest.json"
+
 def slugify_filename(name: str) -> str:
     p = Path(name)
     stem, ext = p.stem, p.suffix
@@ -31,8 +36,22 @@ def slugify_filename(name: str) -> str:
     return f"{stem}{ext}"
 
 def find_markdown_files(output_dir: Path, recursive: bool = True) -> List[Path]:
-    pattern = "**/*.md" if recursive else "*.md"
-    return [p for p in output_dir.glob(pattern) if p.is_file()]
+    # scandir walk: only .md entries become Path objects, and directory checks
+    # reuse the DirEntry type instead of a stat per entry
+    files = []
+    stack = [str(output_dir)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            stack.append(entry.path)
+                    elif entry.name.endswith(".md") and entry.is_file():
+                        files.append(Path(entry.path))
+        except OSError:
+            continue
+    return files
 
 def build_rename_map(files: List[Path]) -> Dict[str, str]:
     mapping = {}
@@ -43,30 +62,39 @@ def build_rename_map(files: List[Path]) -> Dict[str, str]:
                 mapping[f.name] = new_name
     return mapping
 
-def apply_renames(files: List[Path], mapping: Dict[str, str]):
-    """Apply file renames atomically to avoid TOCTOU race conditions"""
-    by_dir: Dict[Path, List[Path]] = {}
-    for f in files:
-        by_dir.setdefault(f.parent, []).append(f)
-    for folder, flist in by_dir.items():
-        for src in flist:
-            old = src.name
-            if old not in mapping:
-                continue
-            new = mapping[old]
-            dst = folder / new
+def apply_renames(files: List[Path], mapping: Dict[str, str]) -> List[Path]:
+    """Apply file renames atomically to avoid TOCTOU race conditions
 
-            # Security: Atomic move to prevent TOCTOU race conditions
+    Returns:
+        The markdown file list with renamed entries pointing at their new paths
+    """
+    result = []
+    for src in files:
+        old = src.name
+        if old not in mapping:
+            result.append(src)
+            continue
+        new = mapping[old]
+        dst = src.with_name(new)
+
+        # Security: Atomic rename to prevent TOCTOU race conditions
+        try:
+            # Try to rename directly first
+            os.rename(src, dst)
+            result.append(dst)
+        except FileExistsError:
+            # If destination exists, backup and retry atomically
             try:
-                # Try to move directly first
-                shutil.move(str(src), str(dst))
-            except FileExistsError:
-                # If destination exists, backup and retry atomically
-                try:
-                    shutil.move(str(dst), str(folder / (new + ".bak")))
-                    shutil.move(str(src), str(dst))
-                except (IOError, OSError, PermissionError) as e:
-                    logger.warning(f"Warning: Could not rename {old} to {new}: {e}")
+                os.rename(dst, dst.with_name(new + ".bak"))
+                os.rename(src, dst)
+                result.append(dst)
+            except (IOError, OSError, PermissionError) as e:
+                logger.warning(f"Warning: Could not rename {old} to {new}: {e}")
+                result.append(src)
+        except OSError as e:
+            logger.warning(f"Warning: Could not rename {old} to {new}: {e}")
+            result.append(src)
+    return result
 
 def rewrite_links_in_file(p: Path, mapping: Dict[str, str]) -> bool:
     text = p.read_text(encoding="utf-8", errors="ignore")
@@ -211,7 +239,49 @@ def ensure_front_matter(files: List[Path]) -> int:
             logger.debug(f"Could not add front matter to {md}: {e}")
     return changed
 
-def sanitize_output_dir(output_dir: str, recursive: bool = True, to_div: bool = False) -> dict:
+def load_manifest(od: Path, options: Dict[str, Any]) -> Dict[str, int]:
+    """Return the {relative path: mtime_ns} entries recorded by the last run.
+
+    Entries only count when that run used the same options (e.g. to_div):
+    a file sanitized under other options is not sanitized for these.
+    """
+    try:
+        with open(od / MANIFEST_NAME, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(manifest, dict) or manifest.get("options") != options:
+        return {}
+    files = manifest.get("files")
+    return files if isinstance(files, dict) else {}
+
+def save_manifest(od: Path, files: List[Path], options: Dict[str, Any]) -> None:
+    entries = {}
+    for md in files:
+        try:
+            entries[md.relative_to(od).as_posix()] = md.stat().st_mtime_ns
+        except OSError:
+            continue
+    tmp = od / (MANIFEST_NAME + ".tmp")
+    try:
+        tmp.write_text(json.dumps({"options": options, "files": entries}), encoding="utf-8")
+        os.replace(tmp, od / MANIFEST_NAME)
+    except OSError as e:
+        logger.debug(f"Could not write sanitize manifest: {e}")
+
+def unsanitized_files(od: Path, files: List[Path], manifest: Dict[str, int]) -> List[Path]:
+    stale = []
+    for md in files:
+        try:
+            if manifest.get(md.relative_to(od).as_posix()) == md.stat().st_mtime_ns:
+                continue
+        except OSError:
+            pass
+        stale.append(md)
+    return stale
+
+def sanitize_output_dir(output_dir: str, recursive: bool = True, to_div: bool = False,
+                        use_manifest: bool = True) -> dict:
     od = Path(output_dir).resolve()  # Resolve to absolute path
 
     # Security: Prevent directory traversal attacks
@@ -226,16 +296,25 @@ def sanitize_output_dir(output_dir: str, recursive: bool = True, to_div: bool =
     if not files:
         return {"renamed": 0, "mapping": {}, "link_rewrites": 0, "diagrams_sanitized": 0, "files_found": 0, "front_matter_added": 0}
 
-    fm_changed = ensure_front_matter(files)
+    # Front matter and Mermaid fixes are per-file: each pass skips files unchanged
+    # since a run with the same options (renamed or rewritten files have a new
+    # path or mtime). Renames and link rewrites span files, so they consider all.
+    options = {"to_div": to_div}
+    manifest = load_manifest(od, options) if use_manifest else {}
+    stale = set(unsanitized_files(od, files, manifest))
+
+    fm_changed = ensure_front_matter([md for md in files if md in stale])
     mapping = build_rename_map(files)
     renamed = 0
     if mapping:
-        apply_renames(files, mapping)
+        renamed_files = apply_renames(files, mapping)
+        stale = {new for old, new in zip(files, renamed_files) if old in stale}
+        files = renamed_files
         renamed = len(mapping)
-        files = find_markdown_files(od, recursive=recursive)
 
     rewrites = rewrite_links(files, mapping)
-    diagrams_fixed = sanitize_mermaid_in_files(files, to_div=to_div)
+    diagrams_fixed = sanitize_mermaid_in_files([md for md in files if md in stale], to_div=to_div)
+    save_manifest(od, files, options)
 
     return {
         "files_found": len(files),
@@ -251,9 +330,11 @@ def main():
     ap.add_argument("--dir", required=True, help="Directory (e.g., /workspace/output/WordPress or /workspace/output)")
     ap.add_argument("--no-recursive", action="store_true", help="Do not recurse into subfolders")
     ap.add_argument("--to-div", action="store_true", help="Convert ```mermaid fences into <div class=\"mermaid\"> blocks")
+    ap.add_argument("--force", action="store_true", help="Reprocess every file, ignoring the sanitize manifest")
     args = ap.parse_args()
 
-    summary = sanitize_output_dir(args.dir, recursive=(not args.no_recursive), to_div=args.to_div)
+    summary = sanitize_output_dir(args.dir, recursive=(not args.no_recursive), to_div=args.to_div,
+                                  use_manifest=not args.force)
     logger.info("Sanitization Summary:")
     logger.info(f"  Markdown files found: {summary['files_found']}")
     logger.info(f"  Front matter added:   {summary['front_matter_added']} files")
@@ -1,20 +1,27 @@
 """
 Integration tests for LLM client functionality.
 """
+import json
 import pytest
 from unittest.mock import Mock, patch
 import flowscribe_utils
 
 
+def _json_response(payload):
+    """Build a mocked streaming response whose body is payload as JSON."""
+    response = Mock()
+    response.iter_content.return_value = [json.dumps(payload).encode('utf-8')]
+    return response
+
+
 class TestLLMClientIntegration:
     """Integration tests for LLM client with cost tracking."""
 
-    @patch('flowscribe_utils.requests.post')
+    @patch('flowscribe_utils.requests.Session.post')
     def test_llm_call_with_tracking(self, mock_post):
         """Test complete LLM call flow with cost tracking."""
         # Mock API response
-        mock_response = Mock()
-        mock_response.json.return_value = {
+        mock_response = _json_response({
             'choices': [{'message': {'content': 'Generated C4 diagram'}}],
             'usage': {
                 'prompt_tokens': 500,
@@ -24,7 +31,7 @@ class TestLLMClientIntegration:
             },
             'model': 'anthropic/claude-sonnet-4-20250514',
             'id': 'test-generation-123'
-        }
+        })
         mock_post.return_value = mock_response
 
         # Create client with tracker
@@ -51,23 +58,21 @@ class TestLLMClientIntegration:
         assert summary['num_calls'] == 1
         assert summary['total_cost'] > 0
 
-    @patch('flowscribe_utils.requests.post')
+    @patch('flowscribe_utils.requests.Session.post')
     def test_multiple_llm_calls_tracking(self, mock_post):
         """Test multiple LLM calls with cumulative tracking."""
         # Mock API responses
-        mock_response1 = Mock()
-        mock_response1.json.return_value = {
+        mock_response1 = _json_response({
             'choices': [{'message': {'content': 'Response 1'}}],
             'usage': {'prompt_tokens': 100, 'completion_tokens': 200, 'cost': 0.003},
             'model': 'test/model'
-        }
+        })
 
-        mock_response2 = Mock()
-        mock_response2.json.return_value = {
+        mock_response2 = _json_response({
             'choices': [{'message': {'content': 'Response 2'}}],
             'usage': {'prompt_tokens': 150, 'completion_tokens': 250, 'cost': 0.004},
             'model': 'test/model'
-        }
+        })
 
         mock_post.side_effect = [mock_response1, mock_response2]
 
@@ -86,17 +91,16 @@ class TestLLMClientIntegration:
         assert len(tracker.calls) == 2
         assert abs(tracker.total_cost - 0.007) < 0.0001  # 0.003 + 0.004
 
-    @patch('flowscribe_utils.requests.post')
+    @patch('flowscribe_utils.requests.Session.post')
     def test_llm_call_with_json_response(self, mock_post):
         """Test LLM call that returns JSON and parsing."""
         # Mock API response with JSON content
         json_content = '```json\n{"layers": ["Presentation", "Business", "Data"]}\n```'
-        mock_response = Mock()
-        mock_response.json.return_value = {
+        mock_response = _json_response({
             'choices': [{'message': {'content': json_content}}],
             'usage': {'prompt_tokens': 100, 'completion_tokens': 50},
             'model': 'test/model'
-        }
+        })
         mock_post.return_value = mock_response
 
         # Create client and make call
@@ -0,0 +1,367 @@
+"""
+Unit tests for flowscribe-analyze.py.
+"""
+import importlib.util
+import os
+import pytest
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+
+SCRIPT_PATH = Path(__file__).parent.parent.parent / 'scripts' / 'flowscribe-analyze.py'
+
+
+@pytest.fixture(scope='module')
+def analyze():
+    """Load flowscribe-analyze.py, whose file name is not importable."""
+    spec = importlib.util.spec_from_file_location('flowscribe_analyze', SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _analyzer(analyze, tmp_path, use_cache=True):
+    return analyze.FlowscribeAnalyzer(
+        'https://github.com/owner/repo', tmp_path / 'workspace', tmp_path / 'output',
+        'test-key', 'test/model', use_cache=use_cache
+    )
+
+
+class TestChildEnvironment:
+    """Tests for passing the LLM cache directory to generator scripts."""
+
+    def test_init_leaves_environment_untouched(self, analyze, tmp_path, monkeypatch):
+        """Test creating an analyzer does not modify os.environ."""
+        monkeypatch.delenv('FLOWSCRIBE_LLM_CACHE_DIR', raising=False)
+
+        _analyzer(analyze, tmp_path)
+
+        assert 'FLOWSCRIBE_LLM_CACHE_DIR' not in os.environ
+
+    def test_run_script_passes_cache_dir(self, analyze, tmp_path):
+        """Test generator scripts get the cache directory in their environment."""
+        analyzer = _analyzer(analyze, tmp_path)
+
+        with patch.object(analyzer, 'run_command', return_value=(True, '', '')) as mock_run:
+            analyzer.run_script('sanitize_output_files.py', [], 'Sanitize')
+
+        env = mock_run.call_args.kwargs['env']
+        assert env['FLOWSCRIBE_LLM_CACHE_DIR'] == str(analyzer.llm_cache_dir)
+
+    def test_run_script_without_cache(self, analyze, tmp_path, monkeypatch):
+        """Test an inherited cache directory is dropped when caching is off."""
+        monkeypatch.setenv('FLOWSCRIBE_LLM_CACHE_DIR', str(tmp_path / 'stale'))
+        analyzer = _analyzer(analyze, tmp_path, use_cache=False)
+
+        with patch.object(analyzer, 'run_command', return_value=(True, '', '')) as mock_run:
+            analyzer.run_script('sanitize_output_files.py', [], 'Sanitize')
+
+        assert 'FLOWSCRIBE_LLM_CACHE_DIR' not in mock_run.call_args.kwargs['env']
+        assert os.environ['FLOWSCRIBE_LLM_CACHE_DIR'] == str(tmp_path / 'stale')
+
+
+DEPTRAC_LAYERS = """  layers:
+    - name: Src
+      collectors:
+        - type: directory
+          value: src/.*
+"""
+
+
+class TestParseDeptracYaml:
+    """Tests for dropping non-existent paths from generated deptrac.yaml."""
+
+    @pytest.fixture
+    def project_dir(self, tmp_path):
+        (tmp_path / 'src').mkdir()
+        return tmp_path
+
+    def _parse(self, analyze, project_dir, paths_block):
+        yaml_content, config = analyze.parse_deptrac_yaml(
+            "deptrac:\n" + paths_block + DEPTRAC_LAYERS, project_dir)
+        assert config is not None
+        assert config['deptrac']['paths'] == ['./src']
+        assert analyze.yaml.safe_load(yaml_content) == config
+        return yaml_content
+
+    def test_block_list_is_patched_in_place(self, analyze, project_dir):
+        """Test a plain block list keeps the original text minus the item."""
+        yaml_content = self._parse(analyze, project_dir,
+                                   "  # Analysed paths\n  paths:\n    - ./src\n    - ./missing\n")
+        assert '# Analysed paths' in yaml_content
+        assert './missing' not in yaml_content
+
+    def test_differently_quoted_item(self, analyze, project_dir):
+        """Test an item whose quoting hides it from the line cut."""
+        self._parse(analyze, project_dir, '  paths:\n    - ./src\n    - "./mi\\x73sing"\n')
+
+    def test_item_with_inline_comment(self, analyze, project_dir):
+        """Test an item followed by an inline comment."""
+        self._parse(analyze, project_dir, "  paths:\n    - ./src\n    - ./missing  # legacy\n")
+
+    def test_flow_style_inside_block_list(self, analyze, project_dir):
+        """Test a flow-style paths list inside the deptrac block mapping."""
+        self._parse(analyze, project_dir, "  paths: [./src, ./missing]\n")
+
+
+class TestParseGithubUrl:
+    """Tests for FlowscribeAnalyzer.parse_github_url."""
+
+    @pytest.mark.parametrize('url', [
+        'https://github.com/owner/repo',
+        'https://github.com/owner/repo.git',
+        'https://www.github.com/owner/repo/',
+        'git@github.com:owner/repo.git',
+        'github.com/owner/repo',
+    ])
+    def test_valid_urls(self, analyze, tmp_path, url):
+        """Test the supported URL forms yield owner and repo."""
+        assert _analyzer(analyze, tmp_path).parse_github_url(url) == ('owner', 'repo')
+
+    @pytest.mark.parametrize('url', [
+        'https://notgithub.com/owner/repo',
+        'https://github.com.evil.com/owner/repo',
+        'https://gitlab.com/owner/repo',
+    ])
+    def test_other_hosts_rejected(self, analyze, tmp_path, url):
+        """Test hosts that merely end in or contain github.com are rejected."""
+        with pytest.raises(ValueError, match="Invalid GitHub URL format"):
+            _analyzer(analyze, tmp_path).parse_github_url(url)
+
+    def test_invalid_owner_name(self, analyze, tmp_path):
+        """Test bad characters in the owner get a specific error."""
+        with pytest.raises(ValueError, match="Invalid GitHub owner name"):
+            _analyzer(analyze, tmp_path).parse_github_url('https://github.com/own*er/repo')
+
+    def test_invalid_repo_name(self, analyze, tmp_path):
+        """Test bad characters in the repository get a specific error."""
+        with pytest.raises(ValueError, match="Invalid GitHub repository name"):
+            _analyzer(analyze, tmp_path).parse_github_url('https://github.com/owner/re po')
+
+
+class TestCacheSwitch:
+    """Tests for turning the LLM cache off from the command line."""
+
+    def _main_use_cache(self, analyze, argv, monkeypatch):
+        monkeypatch.setenv('OPENROUTER_API_KEY', 'test-key')
+        with patch.object(analyze, 'FlowscribeAnalyzer') as mock_analyzer, \
+             patch('sys.argv', ['flowscribe-analyze.py', 'https://github.com/owner/repo'] + argv):
+            mock_analyzer.return_value.run.return_value = True
+            with pytest.raises(SystemExit):
+                analyze.main()
+        return mock_analyzer.call_args.kwargs['use_cache']
+
+    def test_cache_on_by_default(self, analyze, monkeypatch):
+        """Test the cache is used unless switched off."""
+        monkeypatch.delenv('FLOWSCRIBE_LLM_CACHE', raising=False)
+        assert self._main_use_cache(analyze, [], monkeypatch) is True
+
+    def test_no_cache_flag(self, analyze, monkeypatch):
+        """Test --no-cache disables the cache."""
+        monkeypatch.delenv('FLOWSCRIBE_LLM_CACHE', raising=False)
+        assert self._main_use_cache(analyze, ['--no-cache'], monkeypatch) is False
+
+    def test_cache_disabled_by_env(self, analyze, monkeypatch):
+        """Test FLOWSCRIBE_LLM_CACHE=0 disables the cache."""
+        monkeypatch.setenv('FLOWSCRIBE_LLM_CACHE', '0')
+        assert self._main_use_cache(analyze, [], monkeypatch) is False
+
+    def test_analyzer_without_cache(self, analyze, tmp_path):
+        """Test use_cache=False leaves the LLM client without a cache."""
+        analyzer = _analyzer(analyze, tmp_path, use_cache=False)
+
+        assert analyzer.llm.cache is None
+        assert not (tmp_path / 'output' / '.flowscribe-llm-cache').exists()
+
+
+def _git(repo, *args):
+    subprocess.run(['git', '-C', str(repo), '-c', 'user.name=Test', '-c', 'user.email=test@example.com',
+                    *args], check=True, capture_output=True)
+
+
+@pytest.fixture
+def git_project(tmp_path):
+    """Git checkout with one committed PHP file."""
+    if shutil.which('git') is None:
+        pytest.skip('git is not installed')
+    repo = tmp_path / 'project'
+    (repo / 'src').mkdir(parents=True)
+    (repo / 'src' / 'App.php').write_text('<?php', encoding='utf-8')
+    _git(repo, 'init', '-q')
+    _git(repo, 'add', '.')
+    _git(repo, 'commit', '-q', '-m', 'init')
+    return repo
+
+
+class TestStructureCache:
+    """Tests for the git-fingerprinted .flowscribe-structure.json cache."""
+
+    def test_fingerprint_none_outside_git(self, analyze, tmp_path):
+        """Test directories that are not git checkouts have no fingerprint."""
+        assert analyze.git_checkout_fingerprint(tmp_path) is None
+
+    def test_fingerprint_stable(self, analyze, git_project):
+        """Test an unchanged checkout keeps its fingerprint."""
+        assert analyze.git_checkout_fingerprint(git_project) == analyze.git_checkout_fingerprint(git_project)
+
+    def test_fingerprint_changes_on_commit(self, analyze, git_project):
+        """Test a new commit changes the fingerprint."""
+        before = analyze.git_checkout_fingerprint(git_project)
+        (git_project / 'src' / 'Other.php').write_text('<?php', encoding='utf-8')
+        _git(git_project, 'add', '.')
+        _git(git_project, 'commit', '-q', '-m', 'more')
+
+        assert analyze.git_checkout_fingerprint(git_project) != before
+
+    def test_fingerprint_changes_on_untracked_file(self, analyze, git_project):
+        """Test adding an untracked file changes the fingerprint."""
+        before = analyze.git_checkout_fingerprint(git_project)
+        (git_project / 'lib').mkdir()
+        (git_project / 'lib' / 'New.php').write_text('<?php', encoding='utf-8')
+
+        assert analyze.git_checkout_fingerprint(git_project) != before
+
+    def test_scan_uses_cache_until_checkout_changes(self, analyze, git_project, tmp_path):
+        """Test a cached scan is reused for the same checkout and redone after a change."""
+        cache_path = tmp_path / '.flowscribe-structure.json'
+        first = analyze.scan_project_structure(git_project, cache_path)
+        assert first[1] == ['src/App.php']
+
+        with patch.object(analyze, 'list_php_files') as mock_list:
+            assert analyze.scan_project_structure(git_project, cache_path) == first
+            mock_list.assert_not_called()
+
+        (git_project / 'src' / 'Other.php').write_text('<?php', encoding='utf-8')
+        _git(git_project, 'add', '.')
+        _git(git_project, 'commit', '-q', '-m', 'more')
+
+        _, php_files = analyze.scan_project_structure(git_project, cache_path)
+        assert sorted(php_files) == ['src/App.php', 'src/Other.php']
+
+
+class TestRunCommand:
+    """Tests for streaming child output through run_command."""
+
+    def _python(self, code):
+        return [sys.executable, '-c', code]
+
+    def test_output_is_streamed_and_returned(self, analyze, tmp_path, capsys):
+        """Test child output is forwarded live and returned on success."""
+        analyzer = _analyzer(analyze, tmp_path)
+
+        success, stdout, stderr = analyzer.run_command(
+            self._python("import sys; print('out'); print('err', file=sys.stderr)"))
+
+        assert success is True
+        assert stdout == 'out\n'
+        assert stderr == 'err\n'
+        captured = capsys.readouterr()
+        assert 'out\n' in captured.out
+        assert 'err\n' in captured.err
+
+    def test_only_the_tail_is_kept(self, analyze, tmp_path, capsys, monkeypatch):
+        """Test every line is forwarded but only OUTPUT_TAIL_LINES are returned."""
+        monkeypatch.setattr(analyze, 'OUTPUT_TAIL_LINES', 3)
+        analyzer = _analyzer(analyze, tmp_path)
+
+        success, stdout, _ = analyzer.run_command(self._python("for i in range(10): print(i)"))
+
+        assert success is True
+        assert stdout == '7\n8\n9\n'
+        assert capsys.readouterr().out.splitlines()[-10:] == [str(i) for i in range(10)]
+
+    def test_failure_returns_stderr(self, analyze, tmp_path):
+        """Test a non-zero exit code reports failure with the stderr tail."""
+        analyzer = _analyzer(analyze, tmp_path)
+
+        success, _, stderr = analyzer.run_command(
+            self._python("import sys; sys.exit('boom')"))
+
+        assert success is False
+        assert stderr == 'boom\n'
+
+    def test_timeout_kills_the_child(self, analyze, tmp_path):
+        """Test a child running past the timeout is killed and reported."""
+        analyzer = _analyzer(analyze, tmp_path)
+        started = time.monotonic()
+
+        success, _, stderr = analyzer.run_command(
+            self._python("import time; print('started', flush=True); time.sleep(30)"), timeout=0.5)
+
+        assert success is False
+        assert stderr == 'Command timed out'
+        assert time.monotonic() - started < 10
+
+    def test_missing_executable(self, analyze, tmp_path):
+        """Test a command that can't be started reports failure instead of raising."""
+        analyzer = _analyzer(analyze, tmp_path)
+
+        success, stdout, stderr = analyzer.run_command([str(tmp_path / 'no-such-binary')])
+
+        assert success is False
+        assert stdout == ''
+        assert stderr
+
+
+LAYERS = [
+    {'name': 'Controller', 'collectors': [{'type': 'directory', 'value': 'src/Controller/.*'}]},
+    {'name': 'Root', 'collectors': [{'type': 'glob', 'value': '*.php'}]},
+]
+
+
+class TestScanLayers:
+    """Tests for the layer scan run in the background after step 2."""
+
+    def _project(self, analyze, tmp_path):
+        analyzer = _analyzer(analyze, tmp_path)
+        for rel_path in ['index.php', 'src/Controller/Home.php']:
+            path = analyzer.project_dir / rel_path
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text('<?php', encoding='utf-8')
+        return analyzer
+
+    def _check(self, result):
+        names, layer_files, counts = result
+        assert names == ['Controller', 'Root']
+        assert layer_files == {'Controller': ['src/Controller/Home.php'], 'Root': ['index.php']}
+        assert counts == {'Controller': 1, 'Root': 0}
+
+    def test_uses_validated_config(self, analyze, tmp_path):
+        """Test the config parsed in step 2 is reused without reading deptrac.yaml."""
+        analyzer = self._project(analyze, tmp_path)
+        analyzer._deptrac_config = {'deptrac': {'layers': LAYERS}}
+
+        with patch.object(analyze, 'load_yaml_file') as load:
+            self._check(analyzer.scan_layers())
+        load.assert_not_called()
+
+    def test_reads_deptrac_yaml(self, analyze, tmp_path):
+        """Test deptrac.yaml is loaded when no validated config is available."""
+        analyzer = self._project(analyze, tmp_path)
+
+        with patch.object(analyze, 'load_yaml_file',
+                          return_value={'deptrac': {'layers': LAYERS}}) as load:
+            self._check(analyzer.scan_layers())
+        load.assert_called_once_with(analyzer.project_dir / 'deptrac.yaml')
+
+    def test_regex_table_is_compiled_once(self, analyze, tmp_path):
+        """Test repeated scans reuse the compiled layer patterns."""
+        analyzer = self._project(analyze, tmp_path)
+        analyzer._deptrac_config = {'deptrac': {'layers': LAYERS}}
+        analyzer.scan_layers()
+
+        with patch.object(analyze, 'compile_layer_patterns') as compile_patterns:
+            self._check(analyzer.scan_layers())
+        compile_patterns.assert_not_called()
+
+    def test_runs_on_worker_thread(self, analyze, tmp_path):
+        """Test the scan gives the same result when submitted to an executor."""
+        analyzer = self._project(analyze, tmp_path)
+        analyzer._deptrac_config = {'deptrac': {'layers': LAYERS}}
+
+        with analyze.ThreadPoolExecutor(max_workers=1) as executor:
+            self._check(executor.submit(analyzer.scan_layers).result())
@@ -12,6 +12,13 @@ import flowscribe_utils
 from constants import MAX_RESPONSE_SIZE
 
 
+def _json_response(payload):
+    """Build a mocked streaming response whose body is payload as JSON."""
+    response = Mock()
+    response.iter_content.return_value = [json.dumps(payload).encode('utf-8')]
+    return response
+
+
 class TestCostTracker:
     """Tests for the CostTracker class."""
 
@@ -73,6 +80,17 @@ class TestCostTracker:
         assert abs(tracker.total_time - 2.5) < 0.001
         assert tracker.total_cost > 0
 
+    def test_record_call_timestamps_are_utc(self, tmp_path):
+        """Test call and save timestamps use the same ISO 8601 UTC format as LLMClient."""
+        tracker = flowscribe_utils.CostTracker('test/model')
+        with patch('flowscribe_utils.time.time', return_value=1760434205.25):
+            tracker.record_call(1000, 500, 2.5)
+            tracker.save_to_file(str(tmp_path / 'metrics.json'))
+
+        assert tracker.calls[0]['timestamp'] == '2025-10-14T09:30:05.250000Z'
+        saved = json.loads((tmp_path / 'metrics.json').read_text(encoding='utf-8'))
+        assert saved['generated_at'] == '2025-10-14T09:30:05.250000Z'
+
     def test_record_call_with_cost_override(self):
         """Test recording an API call with cost override."""
         tracker = flowscribe_utils.CostTracker('anthropic/claude-sonnet-4-20250514')
@@ -102,6 +120,22 @@ class TestCostTracker:
         assert summary['num_calls'] == 2
         assert summary['model'] == 'anthropic/claude-sonnet-4-20250514'
 
+    def test_save_to_file_skips_unchanged(self, tmp_path):
+        """Test save_to_file only rewrites the file after new calls."""
+        tracker = flowscribe_utils.CostTracker('test/model')
+        tracker.record_call(1000, 500, 2.5)
+        path = str(tmp_path / 'metrics.json')
+
+        with patch('flowscribe_utils.save_json_file') as mock_save:
+            mock_save.side_effect = lambda p, data: open(p, 'w').close()
+            tracker.save_to_file(path)
+            tracker.save_to_file(path)
+            assert mock_save.call_count == 1
+
+            tracker.record_call(100, 50, 1.0)
+            tracker.save_to_file(path)
+            assert mock_save.call_count == 2
+
 
 class TestLLMClient:
     """Tests for the LLMClient class."""
@@ -123,17 +157,21 @@ class TestLLMClient:
         with pytest.raises(ValueError, match="Invalid model name format"):
             flowscribe_utils.LLMClient('test-key', 'model; DROP TABLE users;')
 
+    def test_init_invalid_model_trailing_newline(self):
+        """Test initialization rejects a model name with a trailing newline."""
+        with pytest.raises(ValueError, match="Invalid model name"):
+            flowscribe_utils.LLMClient('test-key', 'test/model\n')
+
     def test_init_with_custom_tracker(self):
         """Test initialization with custom tracker."""
         tracker = flowscribe_utils.CostTracker('test/model')
         client = flowscribe_utils.LLMClient('test-key', 'test/model', tracker=tracker)
         assert client.tracker is tracker
 
-    @patch('flowscribe_utils.requests.post')
+    @patch('flowscribe_utils.requests.Session.post')
     def test_call_success(self, mock_post):
         """Test successful API call."""
-        mock_response = Mock()
-        mock_response.json.return_value = {
+        mock_response = _json_response({
             'choices': [{'message': {'content': 'Test response'}}],
             'usage': {
                 'prompt_tokens': 100,
@@ -143,7 +181,7 @@ class TestLLMClient:
             },
             'model': 'anthropic/claude-sonnet-4',
             'id': 'test-id-123'
-        }
+        })
         mock_post.return_value = mock_response
 
         client = flowscribe_utils.LLMClient('test-key', 'anthropic/claude-sonnet-4')
@@ -156,7 +194,7 @@ class TestLLMClient:
         assert result['total_tokens'] == 150
         assert result['id'] == 'test-id-123'
 
-    @patch('flowscribe_utils.requests.post')
+    @patch('flowscribe_utils.requests.Session.post')
     def test_call_timeout(self, mock_post, caplog):
         """Test API call timeout."""
         import requests
@@ -168,7 +206,7 @@ class TestLLMClient:
         assert result is None
         assert 'timed out' in caplog.text
 
-    @patch('flowscribe_utils.requests.post')
+    @patch('flowscribe_utils.requests.Session.post')
     def test_call_request_error(self, mock_post, caplog):
         """Test API call with request error."""
         import requests
@@ -180,16 +218,15 @@ class TestLLMClient:
         assert result is None
         assert 'failed' in caplog.text
 
-    @patch('flowscribe_utils.requests.post')
+    @patch('flowscribe_utils.requests.Session.post')
     def test_call_response_size_limit(self, mock_post, caplog):
         """Test API call with response size limit."""
         large_content = 'x' * (MAX_RESPONSE_SIZE + 1000)
-        mock_response = Mock()
-        mock_response.json.return_value = {
+        mock_response = _json_response({
             'choices': [{'message': {'content': large_content}}],
             'usage': {'prompt_tokens': 100, 'completion_tokens': 50},
             'model': 'test/model'
-        }
+        })
         mock_post.return_value = mock_response
 
         client = flowscribe_utils.LLMClient('test-key', 'test/model')
@@ -198,10 +235,54 @@ class TestLLMClient:
         assert len(result['content']) == MAX_RESPONSE_SIZE
         assert 'truncated' in caplog.text
 
+    @patch('flowscribe_utils.requests.Session.post')
+    def test_call_response_body_limit(self, mock_post, monkeypatch, caplog):
+        """Test API call stops reading a body larger than the cap."""
+        monkeypatch.setattr(flowscribe_utils, 'MAX_RESPONSE_BODY_SIZE', 10)
+        mock_response = Mock()
+        mock_response.iter_content.return_value = [b'{"choices": ', b'[]}']
+        mock_post.return_value = mock_response
+
+        client = flowscribe_utils.LLMClient('test-key', 'test/model')
+        result = client.call('Test prompt')
+
+        assert result is None
+        assert 'exceeded' in caplog.text
+        mock_response.close.assert_called_once()
+
+    @patch('flowscribe_utils.requests.Session.post')
+    def test_call_uses_cache(self, mock_post, tmp_path):
+        """Test repeated prompts are answered from the cache."""
+        mock_response = _json_response({
+            'choices': [{'message': {'content': 'Cached response'}}],
+            'usage': {'prompt_tokens': 100, 'completion_tokens': 50, 'cost': 0.002},
+            'model': 'test/model'
+        })
+        mock_post.return_value = mock_response
+
+        cache = flowscribe_utils.LLMCache(tmp_path / 'cache')
+        client = flowscribe_utils.LLMClient('test-key', 'test/model', cache=cache)
+        first = client.call('Test prompt')
+        second = client.call('Test prompt')
+
+        assert mock_post.call_count == 1
+        assert second['content'] == first['content']
+        assert second['cost'] == 0.0
+        assert second['cached'] is True
+        # The hit is recorded as a zero-cost call tagged as cached
+        assert len(client.tracker.calls) == 2
+        assert client.tracker.calls[1]['cached'] is True
+        assert client.tracker.total_cost == 0.002
+
 
 class TestUtilityFunctions:
     """Tests for utility functions."""
 
+    def test_iso_utc(self):
+        """Test epoch timestamps format as ISO 8601 UTC."""
+        assert flowscribe_utils.iso_utc(0) == '1970-01-01T00:00:00.000000Z'
+        assert flowscribe_utils.iso_utc(1760434205.25) == '2025-10-14T09:30:05.250000Z'
+
     def test_parse_llm_json_valid(self):
         """Test parsing valid JSON."""
         json_str = '{"key": "value", "number": 42}'
@@ -227,6 +308,181 @@ class TestUtilityFunctions:
         assert result is None
         assert 'Failed to parse JSON' in caplog.text
 
+    @pytest.mark.parametrize('use_orjson', [True, False])
+    def test_save_and_load_json_file_roundtrip(self, tmp_path, monkeypatch, use_orjson):
+        """Test JSON file helpers with and without orjson."""
+        if not use_orjson:
+            monkeypatch.setattr(flowscribe_utils, 'orjson', None)
+        elif flowscribe_utils.orjson is None:
+            pytest.skip("orjson not installed")
+
+        data = {'project': 'Test', 'breakdown': {'level1': {'cost': 0.5, 'tokens': 10}}}
+        path = tmp_path / 'metrics.json'
+        flowscribe_utils.save_json_file(str(path), data)
+
+        assert flowscribe_utils.load_json_file(str(path)) == data
+        assert '\n  "project"' in path.read_text(encoding='utf-8')
+
+    def test_atomic_write_replaces_file(self, tmp_path):
+        """Test atomic_write overwrites the target and leaves no temp file"""
+        path = tmp_path / "deptrac.yaml"
+        path.write_text("old")
+
+        flowscribe_utils.atomic_write(str(path), "new")
+
+        assert path.read_text() == "new"
+        assert list(tmp_path.iterdir()) == [path]
+
+    def test_load_yaml_file_reuses_parse(self, tmp_path):
+        """Test load_yaml_file returns the cached parse until the file changes"""
+        path = tmp_path / "deptrac.yaml"
+        path.write_text("deptrac:\n  paths: [src]\n")
+
+        first = flowscribe_utils.load_yaml_file(str(path))
+        assert first == {'deptrac': {'paths': ['src']}}
+        assert flowscribe_utils.load_yaml_file(str(path)) is first
+
+        path.write_text("deptrac:\n  paths: [src, lib]\n")
+        assert flowscribe_utils.load_yaml_file(str(path))['deptrac']['paths'] == ['src', 'lib']
+
+    def test_load_json_file_invalid(self, tmp_path):
+        """Test loading an invalid JSON file raises a ValueError."""
+        path = tmp_path / 'broken.json'
+        path.write_text('{"files": ', encoding='utf-8')
+
+        with pytest.raises(ValueError):
+            flowscribe_utils.load_json_file(str(path))
+
+    def test_append_jsonl(self, tmp_path):
+        """Test appending records to a JSONL file."""
+        path = tmp_path / 'metrics.jsonl'
+        flowscribe_utils.append_jsonl(str(path), {'step': 'level1', 'cost': 0.1})
+        flowscribe_utils.append_jsonl(str(path), {'step': 'level2', 'cost': 0.2})
+
+        lines = path.read_text(encoding='utf-8').splitlines()
+        assert [json.loads(line)['step'] for line in lines] == ['level1', 'level2']
+
+    def test_deptrac_collector_regex(self):
+        """Test directory collector values are matched as path regexes."""
+        pattern = flowscribe_utils.deptrac_collector_regex('./src/Controller/.*')
+        assert pattern.match('src/Controller/Admin/UserController.php')
+        assert not pattern.match('src/Model/User.php')
+        assert flowscribe_utils.deptrac_collector_regex('src/(broken').match('src/(broken/a.php')
+
+    def test_deptrac_glob_regex(self):
+        """Test glob collector values follow Path.glob semantics."""
+        assert flowscribe_utils.deptrac_glob_regex('*.php').match('index.php')
+        assert not flowscribe_utils.deptrac_glob_regex('*.php').match('src/index.php')
+        assert flowscribe_utils.deptrac_glob_regex('src/**/*.php').match('src/a/b/c.php')
+
+    def test_collect_layer_files(self, tmp_path):
+        """Test files are collected per layer, skipping vendor and test paths."""
+        for rel_path in ['index.php', 'src/Controller/Home.php', 'src/Model/User.php',
+                         'src/tests/HomeTest.php', 'vendor/lib/Lib.php']:
+            (tmp_path / rel_path).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / rel_path).write_text('<?php', encoding='utf-8')
+        layers = [
+            {'name': 'Controller', 'collectors': [{'type': 'directory', 'value': 'src/Controller/.*'}]},
+            {'name': 'Source', 'collectors': [{'type': 'directory', 'value': 'src/.*'}]},
+            {'name': 'Root', 'collectors': [{'type': 'glob', 'value': '*.php'}]},
+        ]
+
+        layer_files = flowscribe_utils.collect_layer_files(str(tmp_path), layers)
+
+        assert layer_files['Controller'] == ['src/Controller/Home.php']
+        assert sorted(layer_files['Source']) == ['src/Controller/Home.php', 'src/Model/User.php']
+        assert layer_files['Root'] == ['index.php']
+
+    def test_compile_layer_patterns(self):
+        """Test the layer regex table combines collectors and walk roots."""
+        layers = [
+            {'name': 'Controller', 'collectors': [{'type': 'directory', 'value': 'src/Controller/.*'}]},
+            {'name': 'Admin', 'collectors': [{'type': 'directory', 'value': 'wp-admin/.*'},
+                                             {'type': 'glob', 'value': 'admin/*.php'}]},
+        ]
+
+        layer_matchers, roots = flowscribe_utils.compile_layer_patterns(layers)
+
+        assert [name for name, _, _ in layer_matchers] == ['Controller', 'Admin']
+        assert layer_matchers[0][1] == ('src/Controller/',)
+        assert layer_matchers[1][2].match('admin/index.php')
+        assert roots == ['admin', 'src/Controller', 'wp-admin']
+
+    def test_collect_layer_files_literal_prefixes(self, tmp_path):
+        """Test nested literal collector prefixes are walked once."""
+        for rel_path in ['index.php', 'src/Controller/Home.php', 'src-old/Legacy.php']:
+            (tmp_path / rel_path).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / rel_path).write_text('<?php', encoding='utf-8')
+        layers = [
+            {'name': 'Controller', 'collectors': [{'type': 'directory', 'value': 'src/Controller/.*'}]},
+            {'name': 'Source', 'collectors': [{'type': 'directory', 'value': './src/.*'}]},
+            {'name': 'Legacy', 'collectors': [{'type': 'directory', 'value': 'src-old/.*'}]},
+        ]
+
+        layer_files = flowscribe_utils.collect_layer_files(str(tmp_path), layers)
+
+        assert layer_files == {
+            'Controller': ['src/Controller/Home.php'],
+            'Source': ['src/Controller/Home.php'],
+            'Legacy': ['src-old/Legacy.php'],
+        }
+
+    def test_count_directory_collector_files_skips_glob_only_layer(self, tmp_path):
+        """Test layer counts use directory collectors only, so glob-only layers get 0."""
+        for rel_path in ['index.php', 'src/Controller/Home.php']:
+            (tmp_path / rel_path).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / rel_path).write_text('<?php', encoding='utf-8')
+        layers = [
+            {'name': 'Controller', 'collectors': [{'type': 'directory', 'value': 'src/Controller/.*'},
+                                                  {'type': 'glob', 'value': '*.php'}]},
+            {'name': 'Root', 'collectors': [{'type': 'glob', 'value': '*.php'}]},
+        ]
+
+        layer_files = flowscribe_utils.collect_layer_files(str(tmp_path), layers)
+        counts = flowscribe_utils.count_directory_collector_files(layers, layer_files)
+
+        assert layer_files['Root'] == ['index.php']
+        assert counts == {'Controller': 1, 'Root': 0}
+
+    def test_collect_layer_files_test_dirs_match_whole_parts(self, tmp_path):
+        """Test only whole test directory names are skipped, not names containing 'test'."""
+        for rel_path in ['src/Contest/Entry.php', 'attestation/Signer.php',
+                         'src/tests/Fixture.php', 'src/Tests/Fixture.php', 'vendor/acme/Lib.php']:
+            (tmp_path / rel_path).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / rel_path).write_text('<?php', encoding='utf-8')
+        layers = [
+            {'name': 'Contest', 'collectors': [{'type': 'directory', 'value': 'src/Contest/.*'}]},
+            {'name': 'Attestation', 'collectors': [{'type': 'directory', 'value': 'attestation/.*'}]},
+            {'name': 'Source', 'collectors': [{'type': 'directory', 'value': 'src/.*'}]},
+            {'name': 'Fixtures', 'collectors': [{'type': 'directory', 'value': 'src/tests/.*'}]},
+            {'name': 'Vendor', 'collectors': [{'type': 'directory', 'value': 'vendor/acme/.*'}]},
+        ]
+
+        layer_files = flowscribe_utils.collect_layer_files(str(tmp_path), layers)
+
+        assert layer_files['Contest'] == ['src/Contest/Entry.php']
+        assert layer_files['Attestation'] == ['attestation/Signer.php']
+        assert layer_files['Source'] == ['src/Contest/Entry.php']
+        assert layer_files['Fixtures'] == []
+        # Explicitly configured vendor roots are walked
+        assert layer_files['Vendor'] == ['vendor/acme/Lib.php']
+
+    def test_collect_layer_files_cache_paths(self, tmp_path):
+        """Test framework cache paths are pruned but configured roots are walked."""
+        for rel_path in ['var/cache/prod/Container.php', 'bootstrap/cache/services.php',
+                         'src/Cache/Pool.php', 'build/Generated.php']:
+            (tmp_path / rel_path).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / rel_path).write_text('<?php', encoding='utf-8')
+        layers = [
+            {'name': 'All', 'collectors': [{'type': 'glob', 'value': '**/*.php'}]},
+            {'name': 'Build', 'collectors': [{'type': 'directory', 'value': 'build/.*'}]},
+        ]
+
+        layer_files = flowscribe_utils.collect_layer_files(str(tmp_path), layers)
+
+        assert sorted(layer_files['All']) == ['build/Generated.php', 'src/Cache/Pool.php']
+        assert layer_files['Build'] == ['build/Generated.php']
+
     def test_get_api_config_success(self, monkeypatch):
         """Test getting API config from environment."""
         monkeypatch.setenv('OPENROUTER_API_KEY', 'test-key-123')
@@ -327,8 +583,10 @@ class TestMermaidIdRegistry:
         id1 = registry.uid('Component')
         id2 = registry.uid('Component')
         assert id1 != id2
+        id3 = registry.uid('Component')
         assert id1 == 'Component'
-        assert '_' in id2  # Should have hash suffix
+        assert id2 == 'Component_2'
+        assert id3 == 'Component_3'
 
     def test_uid_sanitization(self):
         """Test UID generation with sanitization."""
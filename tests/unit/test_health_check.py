@@ -0,0 +1,46 @@
+"""
+Unit tests for health_check.py.
+"""
+import json
+import pytest
+from unittest.mock import patch
+
+import health_check
+
+
+class TestQuickCheck:
+    """Tests for the --quick mode that skips the slower probes."""
+
+    def test_run_all_checks_quick_skips_slow_checks(self):
+        """Test quick_check leaves out the dependency and disk space checks."""
+        health = health_check.HealthCheck()
+
+        with patch.object(health, 'check_dependencies') as mock_deps, \
+             patch.object(health, 'check_disk_space') as mock_disk:
+            results = health.run_all_checks(quick_check=True)
+
+        mock_deps.assert_not_called()
+        mock_disk.assert_not_called()
+        assert 'dependencies' not in results['checks']
+        assert 'disk_space' not in results['checks']
+        assert 'python_version' in results['checks']
+
+    def test_run_all_checks_full_includes_slow_checks(self):
+        """Test a full run includes the dependency and disk space checks."""
+        health = health_check.HealthCheck()
+
+        results = health.run_all_checks()
+
+        assert 'dependencies' in results['checks']
+        assert 'disk_space' in results['checks']
+
+    def test_main_quick_flag(self, capsys):
+        """Test the --quick CLI flag reaches run_all_checks."""
+        with patch('sys.argv', ['health_check.py', '--quick', '--json']):
+            with pytest.raises(SystemExit) as exc_info:
+                health_check.main()
+
+        assert exc_info.value.code == 0
+        checks = json.loads(capsys.readouterr().out)['checks']
+        assert 'dependencies' not in checks
+        assert 'disk_space' not in checks
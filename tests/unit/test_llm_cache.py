@@ -0,0 +1,255 @@
+"""
+Unit tests for llm_cache.py.
+"""
+import os
+import pytest
+import time
+from unittest.mock import patch
+
+import flowscribe_utils
+import llm_cache
+from llm_cache import LLMCache
+
+
+RESPONSE = {'content': 'cached answer', 'input_tokens': 10, 'output_tokens': 5}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    """LLMCache in a temporary directory."""
+    return LLMCache(tmp_path / 'cache')
+
+
+class TestCacheKey:
+    """Tests for LLMCache.get_cache_key."""
+
+    def test_same_inputs_same_key(self, cache):
+        """Test identical prompt, model and temperature give the same key."""
+        assert cache.get_cache_key('prompt', 'test/model') == cache.get_cache_key('prompt', 'test/model')
+
+    def test_model_and_temperature_change_key(self, cache):
+        """Test the model and temperature are part of the key."""
+        key = cache.get_cache_key('prompt', 'test/model')
+        assert cache.get_cache_key('prompt', 'other/model') != key
+        assert cache.get_cache_key('prompt', 'test/model', temperature=0.5) != key
+
+    def test_trailing_whitespace_is_ignored(self, cache):
+        """Test prompts differing only in trailing whitespace share a key."""
+        key = cache.get_cache_key("line one\nline two", 'test/model')
+        assert cache.get_cache_key("line one  \nline two\n\n", 'test/model') == key
+        assert cache.get_cache_key("line one\r\nline two\t", 'test/model') == key
+
+    def test_blank_lines_are_significant(self, cache):
+        """Test interior blank lines still distinguish prompts."""
+        assert cache.get_cache_key("a\n\nb", 'test/model') != cache.get_cache_key("a\nb", 'test/model')
+
+    def test_whitespace_is_significant(self, cache):
+        """Test prompts differing only in indentation get separate keys."""
+        nested = "layers:\n  - name: A\n    collectors: []\n"
+        flat = "layers:\n- name: A\ncollectors: []\n"
+        assert cache.get_cache_key(nested, 'test/model') != cache.get_cache_key(flat, 'test/model')
+
+
+class TestGetSet:
+    """Tests for reading and writing cache entries."""
+
+    def test_miss_then_set_then_hit(self, cache):
+        """Test a miss, then a stored response is returned on the next lookup."""
+        assert cache.get('prompt', 'test/model') is None
+
+        cache.set('prompt', 'test/model', RESPONSE)
+
+        assert cache.get('prompt', 'test/model') == RESPONSE
+
+    def test_hit_from_disk(self, cache):
+        """Test a new instance reads entries written by another one."""
+        cache.set('prompt', 'test/model', RESPONSE)
+
+        assert LLMCache(cache.cache_dir).get('prompt', 'test/model') == RESPONSE
+
+    def test_expired_entry(self, tmp_path):
+        """Test entries older than the TTL are not returned and are removed."""
+        cache = LLMCache(tmp_path / 'cache', ttl_hours=0)
+        cache.set('prompt', 'test/model', RESPONSE)
+
+        assert cache.get('prompt', 'test/model') is None
+        assert list(cache.cache_dir.iterdir()) == []
+
+    def test_corrupt_entry_removed(self, cache):
+        """Test an unreadable cache file counts as a miss and is deleted."""
+        key = cache.get_cache_key('prompt', 'test/model')
+        cache._get_cache_path(key).write_text('{not json', encoding='utf-8')
+
+        assert cache.get('prompt', 'test/model') is None
+        assert not cache._get_cache_path(key).exists()
+
+
+class TestMemoryLayers:
+    """Tests for the in-memory negative cache and LRU."""
+
+    def test_negative_cache_skips_filesystem(self, cache):
+        """Test a recent miss is trusted until it expires or set() is called."""
+        assert cache.get('prompt', 'test/model') is None
+        LLMCache(cache.cache_dir).set('prompt', 'test/model', RESPONSE)
+
+        assert cache.get('prompt', 'test/model') is None
+
+    def test_negative_cache_expires(self, cache, monkeypatch):
+        """Test a miss older than NEGATIVE_TTL_SECONDS is looked up again."""
+        assert cache.get('prompt', 'test/model') is None
+        LLMCache(cache.cache_dir).set('prompt', 'test/model', RESPONSE)
+        monkeypatch.setattr(llm_cache, 'NEGATIVE_TTL_SECONDS', 0.0)
+
+        assert cache.get('prompt', 'test/model') == RESPONSE
+
+    def test_set_clears_recorded_miss(self, cache):
+        """Test set() makes a previously missed key readable immediately."""
+        assert cache.get('prompt', 'test/model') is None
+        cache.set('prompt', 'test/model', RESPONSE)
+
+        assert cache.get('prompt', 'test/model') == RESPONSE
+
+    def test_hot_entry_served_from_memory(self, cache):
+        """Test a recently used entry is returned without reading its file."""
+        cache.set('prompt', 'test/model', RESPONSE)
+        cache._get_cache_path(cache.get_cache_key('prompt', 'test/model')).unlink()
+
+        assert cache.get('prompt', 'test/model') == RESPONSE
+
+    def test_lru_evicts_least_recently_used(self, cache, monkeypatch):
+        """Test the LRU keeps at most MAX_HOT_ENTRIES, dropping the oldest use."""
+        monkeypatch.setattr(llm_cache, 'MAX_HOT_ENTRIES', 2)
+        cache.set('a', 'test/model', RESPONSE)
+        cache.set('b', 'test/model', RESPONSE)
+        cache.get('a', 'test/model')
+        cache.set('c', 'test/model', RESPONSE)
+
+        keys = [cache.get_cache_key(p, 'test/model') for p in ('a', 'b', 'c')]
+        assert list(cache._hot) == [keys[0], keys[2]]
+
+
+class TestMaintenance:
+    """Tests for atomic writes and mtime-based expiry."""
+
+    def test_write_leaves_no_temp_files(self, cache):
+        """Test a successful set() leaves only the final .json entry."""
+        cache.set('prompt', 'test/model', RESPONSE)
+
+        names = [p.name for p in cache.cache_dir.iterdir()]
+        assert names == [f"{cache.get_cache_key('prompt', 'test/model')}.json"]
+
+    def test_failed_replace_cleans_up(self, cache):
+        """Test a failed rename removes the temp file and leaves no partial entry."""
+        with patch('llm_cache.os.replace', side_effect=OSError('disk full')):
+            cache.set('prompt', 'test/model', RESPONSE)
+
+        assert list(cache.cache_dir.iterdir()) == []
+
+    def test_clear_expired_uses_mtime(self, cache):
+        """Test clear_expired and get_stats treat old files as expired."""
+        cache.set('old', 'test/model', RESPONSE)
+        cache.set('new', 'test/model', RESPONSE)
+        old_path = cache._get_cache_path(cache.get_cache_key('old', 'test/model'))
+        old_time = time.time() - (cache.ttl_hours + 1) * 3600
+        os.utime(old_path, (old_time, old_time))
+
+        stats = cache.get_stats()
+        assert stats['total_entries'] == 2
+        assert stats['expired_entries'] == 1
+
+        assert cache.clear_expired() == 1
+        assert not old_path.exists()
+        assert cache.get_stats()['total_entries'] == 1
+
+    def test_clear_all(self, cache):
+        """Test clear_all removes every entry and the in-memory state."""
+        cache.set('a', 'test/model', RESPONSE)
+        cache.set('b', 'test/model', RESPONSE)
+
+        assert cache.clear_all() == 2
+        assert cache.get('a', 'test/model') is None
+
+
+class TestOffSwitch:
+    """Tests for disabling the cache through the environment."""
+
+    def test_cache_from_env(self, tmp_path, monkeypatch):
+        """Test generator scripts open the directory the analyzer passes on."""
+        monkeypatch.setenv('FLOWSCRIBE_LLM_CACHE_DIR', str(tmp_path / 'cache'))
+        monkeypatch.delenv('FLOWSCRIBE_LLM_CACHE', raising=False)
+
+        cache = flowscribe_utils.llm_cache_from_env()
+
+        assert cache is not None
+        assert cache.cache_dir == tmp_path / 'cache'
+
+    def test_cache_disabled_by_env(self, tmp_path, monkeypatch):
+        """Test FLOWSCRIBE_LLM_CACHE=0 turns the cache off."""
+        monkeypatch.setenv('FLOWSCRIBE_LLM_CACHE_DIR', str(tmp_path / 'cache'))
+        monkeypatch.setenv('FLOWSCRIBE_LLM_CACHE', '0')
+
+        assert flowscribe_utils.llm_cache_from_env() is None
+
+    def test_cache_off_without_dir(self, monkeypatch):
+        """Test no cache is opened when no directory is configured."""
+        monkeypatch.delenv('FLOWSCRIBE_LLM_CACHE_DIR', raising=False)
+
+        assert flowscribe_utils.llm_cache_from_env() is None
+
+    @patch('flowscribe_utils.requests.Session.post')
+    def test_client_skips_api_on_hit(self, mock_post, cache):
+        """Test LLMClient returns a cached response without calling the API."""
+        cache.set('prompt', 'test/model', RESPONSE)
+        client = flowscribe_utils.LLMClient('test-key', 'test/model', cache=cache)
+
+        result = client.call('prompt')
+
+        mock_post.assert_not_called()
+        assert result['content'] == 'cached answer'
+        assert result['cached'] is True
+        assert result['cost'] == 0.0
+
+    @patch('flowscribe_utils.requests.Session.post')
+    def test_client_records_cached_call(self, mock_post, cache):
+        """Test a cache hit is recorded as a zero-cost call tagged as cached."""
+        cache.set('prompt', 'test/model', RESPONSE)
+        client = flowscribe_utils.LLMClient('test-key', 'test/model', cache=cache)
+
+        client.call('prompt')
+
+        summary = client.tracker.get_summary()
+        assert summary['num_calls'] == 1
+        assert summary['total_cost'] == 0.0
+        assert summary['total_tokens'] == 0
+        assert client.tracker.calls[0]['cached'] is True
+        assert client.tracker.calls[0]['duration'] == 0.0
+
+
+class TestResponseIsolation:
+    """Tests that cached responses can't be changed through returned objects."""
+
+    def test_mutating_hit_does_not_corrupt_cache(self, cache):
+        """Test nested changes to a returned response don't leak into later hits."""
+        cache.set('prompt', 'test/model', {'content': 'x', 'usage': {'prompt_tokens': 1}})
+
+        first = cache.get('prompt', 'test/model')
+        first['usage']['prompt_tokens'] = 999
+
+        assert cache.get('prompt', 'test/model')['usage']['prompt_tokens'] == 1
+
+    def test_mutating_stored_response_does_not_corrupt_cache(self, cache):
+        """Test changing the dict passed to set() afterwards doesn't change the entry."""
+        response = {'content': 'x', 'usage': {'prompt_tokens': 1}}
+        cache.set('prompt', 'test/model', response)
+        response['usage']['prompt_tokens'] = 999
+
+        assert cache.get('prompt', 'test/model')['usage']['prompt_tokens'] == 1
+
+    def test_mutating_disk_hit_does_not_corrupt_cache(self, cache):
+        """Test a response first read from disk is also copied before it is returned."""
+        cache.set('prompt', 'test/model', {'content': 'x', 'usage': {'prompt_tokens': 1}})
+        reader = LLMCache(cache.cache_dir)
+
+        reader.get('prompt', 'test/model')['usage']['prompt_tokens'] = 999
+
+        assert reader.get('prompt', 'test/model')['usage']['prompt_tokens'] == 1
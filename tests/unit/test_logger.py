@@ -0,0 +1,119 @@
+"""
+Unit tests for logger.py.
+"""
+import json
+import logging
+import pytest
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import logger
+
+
+def _record(created):
+    record = logging.LogRecord('test', logging.INFO, __file__, 1, 'message', None, None)
+    record.created = created
+    return record
+
+
+@pytest.fixture(params=['UTC', 'Asia/Kolkata', 'America/St_Johns'])
+def local_tz(request, monkeypatch):
+    """Run under a local time zone with a whole or fractional-hour UTC offset."""
+    if not hasattr(time, 'tzset'):
+        pytest.skip('time.tzset is not available on this platform')
+    monkeypatch.setenv('TZ', request.param)
+    time.tzset()
+    yield request.param
+    monkeypatch.undo()
+    time.tzset()
+
+
+class TestJSONFormatterTimestamp:
+    """Tests for JSONFormatter._format_timestamp."""
+
+    @pytest.mark.parametrize('created', [
+        1_700_000_000.0,          # zero microseconds
+        1_700_000_000.5,
+        1_700_000_000.123456,
+        1_700_000_000.9999996,    # rounds up into the next second
+        1_700_000_000.9999994,    # just below the seconds boundary
+        1_700_000_001.0000004,    # just after the seconds boundary
+    ])
+    def test_matches_isoformat(self, local_tz, created):
+        """Test timestamps match datetime.fromtimestamp(...).isoformat()."""
+        formatter = logger.JSONFormatter()
+        record = _record(created)
+
+        assert formatter._format_timestamp(record.created) == \
+            datetime.fromtimestamp(record.created).isoformat()
+
+    def test_cached_second_is_reused_across_records(self, local_tz):
+        """Test consecutive records in and across a second format correctly."""
+        formatter = logger.JSONFormatter()
+        for created in (1_700_000_000.25, 1_700_000_000.75, 1_700_000_000.9999999, 1_700_000_001.0):
+            assert formatter._format_timestamp(created) == datetime.fromtimestamp(created).isoformat()
+
+
+class TestJSONFormatterSerializer:
+    """Tests for the orjson and json serializer paths of JSONFormatter."""
+
+    def _format(self, formatter):
+        record = _record(1_700_000_000.5)
+        record.path = Path('/tmp/output')
+        record.count = 3
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            record.exc_info = sys.exc_info()
+        return json.loads(formatter.format(record))
+
+    def _check(self, data):
+        assert data['message'] == 'message'
+        assert data['level'] == 'INFO'
+        # Non-serializable extras go through default=str instead of failing
+        assert data['extra'] == {'path': '/tmp/output', 'count': 3}
+        assert 'ValueError: boom' in data['exception']
+
+    def test_orjson_path(self):
+        """Test records serialize with orjson when it is installed."""
+        pytest.importorskip('orjson')
+        self._check(self._format(logger.JSONFormatter()))
+
+    def test_json_fallback_path(self, monkeypatch):
+        """Test records serialize with the stdlib json module without orjson."""
+        monkeypatch.setitem(sys.modules, 'orjson', None)
+        self._check(self._format(logger.JSONFormatter()))
+
+    def test_exclude_extra(self):
+        """Test include_extra=False leaves extra fields out."""
+        assert 'extra' not in self._format(logger.JSONFormatter(include_extra=False))
+
+    @pytest.mark.parametrize('use_orjson', [True, False])
+    def test_non_str_dict_keys(self, monkeypatch, use_orjson):
+        """Test extras with non-string dict keys are logged, not dropped."""
+        if use_orjson:
+            pytest.importorskip('orjson')
+        else:
+            monkeypatch.setitem(sys.modules, 'orjson', None)
+        record = _record(1_700_000_000.5)
+        record.counts = {1: 2}
+
+        data = json.loads(logger.JSONFormatter().format(record))
+
+        assert data['extra']['counts'] == {'1': 2}
+
+    @pytest.mark.parametrize('use_orjson', [True, False])
+    def test_integer_beyond_64_bits(self, monkeypatch, use_orjson):
+        """Test extras with integers orjson can't encode fall back to json."""
+        if use_orjson:
+            pytest.importorskip('orjson')
+        else:
+            monkeypatch.setitem(sys.modules, 'orjson', None)
+        record = _record(1_700_000_000.5)
+        record.big = 2 ** 70
+
+        data = json.loads(logger.JSONFormatter().format(record))
+
+        assert data['extra']['big'] == 2 ** 70
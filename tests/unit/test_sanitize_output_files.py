@@ -0,0 +1,91 @@
+"""
+Unit tests for the sanitize manifest in sanitize_output_files.py.
+"""
+import os
+import pytest
+from unittest.mock import patch
+
+import sanitize_output_files
+
+
+MERMAID_DOC = "# Title\n```mermaid\ngraph TB\n  a.b[x] --> c\n```\n"
+
+
+@pytest.fixture
+def output_dir(tmp_path):
+    """Output directory holding one Markdown file with a Mermaid diagram."""
+    (tmp_path / "doc.md").write_text(MERMAID_DOC, encoding="utf-8")
+    return tmp_path
+
+
+def _bump_mtime(path):
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+class TestSanitizeManifest:
+    """Tests for skipping already-sanitized files on re-runs."""
+
+    def test_rerun_skips_unchanged_files(self, output_dir):
+        """Test a second run does not reprocess unchanged files."""
+        first = sanitize_output_files.sanitize_output_dir(str(output_dir))
+        assert first["front_matter_added"] == 1
+        assert first["diagrams_sanitized"] == 1
+
+        with patch.object(sanitize_output_files, 'sanitize_mermaid_in_files',
+                          wraps=sanitize_output_files.sanitize_mermaid_in_files) as spy:
+            sanitize_output_files.sanitize_output_dir(str(output_dir))
+            assert spy.call_args[0][0] == []
+
+    def test_mtime_change_triggers_reprocessing(self, output_dir):
+        """Test a file modified after the last run is processed again."""
+        sanitize_output_files.sanitize_output_dir(str(output_dir))
+        doc = output_dir / "doc.md"
+        doc.write_text(MERMAID_DOC, encoding="utf-8")
+        _bump_mtime(doc)
+
+        second = sanitize_output_files.sanitize_output_dir(str(output_dir))
+
+        assert second["front_matter_added"] == 1
+        assert second["diagrams_sanitized"] == 1
+
+    def test_to_div_after_default_run(self, output_dir):
+        """Test files sanitized without to_div are converted by a to_div run."""
+        sanitize_output_files.sanitize_output_dir(str(output_dir))
+
+        summary = sanitize_output_files.sanitize_output_dir(str(output_dir), to_div=True)
+
+        assert summary["diagrams_sanitized"] == 1
+        text = (output_dir / "doc.md").read_text(encoding="utf-8")
+        assert '<div class="mermaid">' in text
+        assert "```mermaid" not in text
+
+    def test_force_reprocesses_every_file(self, output_dir):
+        """Test --force (use_manifest=False) ignores the manifest."""
+        sanitize_output_files.sanitize_output_dir(str(output_dir))
+
+        with patch.object(sanitize_output_files, 'sanitize_mermaid_in_files',
+                          wraps=sanitize_output_files.sanitize_mermaid_in_files) as spy:
+            with patch('sys.argv', ['sanitize_output_files.py', '--dir', str(output_dir), '--force']):
+                sanitize_output_files.main()
+            assert spy.call_args[0][0] == [output_dir.resolve() / "doc.md"]
+
+    def test_front_matter_title_uses_original_name(self, tmp_path):
+        """Test front matter is added before renames, so the title keeps the original name."""
+        (tmp_path / "Level 3 (Web).md").write_text("No heading here\n", encoding="utf-8")
+
+        summary = sanitize_output_files.sanitize_output_dir(str(tmp_path))
+
+        assert summary["mapping"] == {"Level 3 (Web).md": "Level-3-Web.md"}
+        text = (tmp_path / "Level-3-Web.md").read_text(encoding="utf-8")
+        assert "title: Level 3 (Web)\n" in text
+
+    def test_renamed_file_is_skipped_on_rerun(self, tmp_path):
+        """Test a file renamed in the first run is recorded under its new name."""
+        (tmp_path / "Level 3 (Web).md").write_text(MERMAID_DOC, encoding="utf-8")
+        sanitize_output_files.sanitize_output_dir(str(tmp_path))
+
+        second = sanitize_output_files.sanitize_output_dir(str(tmp_path))
+
+        assert second["front_matter_added"] == 0
+        assert second["diagrams_sanitized"] == 0